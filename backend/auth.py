@@ -0,0 +1,59 @@
+import hashlib
+import time
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from cache import TTLCache
+from database import get_db, settings
+
+# Security Configuration
+SECRET_KEY = "your-secret-key-change-this-in-production"
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+# Verified claims keyed by sha256(token); each entry expires with the token itself
+token_cache = TTLCache(settings.token_cache_size, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# User documents (without the password hash) keyed by email
+profile_cache = TTLCache(settings.profile_cache_size, settings.profile_cache_ttl_s)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def decode_token(token: str) -> dict:
+    key = _token_key(token)
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if claims.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if "exp" in claims:
+        token_cache.set(key, claims, ttl=claims["exp"] - time.time())
+    return claims
+
+
+async def current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """Dependency for authenticated endpoints: the caller's user document."""
+    email = decode_token(token)["sub"]
+    user = profile_cache.get(email)
+    if user is not None:
+        return user
+    db = get_db()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    user = await db.users.find_one({"email": email}, {"password": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    profile_cache.set(email, user)
+    return user
+
+
+def invalidate_user(email: str):
+    """Call whenever a user document is created or changed."""
+    profile_cache.pop(email)
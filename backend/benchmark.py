@@ -0,0 +1,343 @@
+"""Load-test harness for the API.
+
+Seeds a synthetic corpus shaped like seed_data.py / seed_functional.py and
+drives the main endpoints at a fixed concurrency, printing JSON with
+p50/p95/p99 latency, throughput and RSS so runs can be diffed between
+commits.
+
+    # Everything in one process against mongomock-motor (no mongod needed)
+    python benchmark.py run --mock --resources 10000 --output bench.json
+
+    # Against a local mongod: seed once, then benchmark in-process or a live server
+    python benchmark.py seed --mongo-url mongodb://localhost:27017 --resources 100000
+    python benchmark.py run --mongo-url mongodb://localhost:27017
+    python benchmark.py run --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+COURSES = ["CS101", "CS202", "CS204", "CS301", "CS302", "EC201", "BCA", "B.Tech CS"]
+SUBJECTS = ["Discrete Mathematics", "System Software", "Applied Physics", "AI/ML", "Hardware", "DSA", "Humanities"]
+TYPES = ["Notes", "PYQ", "Summary", "Practical"]
+COLLEGES = ["Global Institute of Tech", "Tech University", "Demo University"]
+TITLE_WORDS = [
+    "Algorithms", "Logic", "Operating", "Systems", "Previous", "Papers", "Physics", "Formula", "Cheat", "Sheet",
+    "Machine", "Learning", "Fundamentals", "Microprocessors", "Data", "Structures", "Lab", "Report", "Economics",
+    "Engineers", "Summary", "Unit", "Revision", "Midterm", "Final", "Solved", "Questions", "Networks", "Compiler",
+]
+TEACHERS = ["Dr. Arvinder Singh", "Prof. Meenakshi", "Dr. Rajesh Verma", "Ms. Pooja Sharma", "Mr. Vikram Aditya"]
+PASSWORD = "benchmark-password"
+SCENARIOS = ["resources", "resources_search", "ratings", "download", "upload", "login"]
+
+DUMMY_PDF = (
+    b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n2 0 obj\n<< /Type /Pages /Kids [3 0 R] "
+    b"/Count 1 >>\nendobj\n3 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>\nendobj\n"
+    b"trailer\n<< /Root 1 0 R >>\n%%EOF"
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def fake_resource(rng: random.Random, filenames) -> dict:
+    words = rng.sample(TITLE_WORDS, 4)
+    return {
+        "title": " ".join(words),
+        "subject": rng.choice(SUBJECTS),
+        "course": rng.choice(COURSES),
+        "author": rng.choice(["Guneet", "Aman", "Ankit", "Ishaan", "Sara", "Dr. Verma"]),
+        "type": rng.choice(TYPES),
+        "downloads": rng.randint(0, 400),
+        "date": (date(2026, 2, 17) - timedelta(days=rng.randint(0, 700))).isoformat(),
+        "privacy": "public",
+        "semester": rng.randint(1, 8),
+        "year": rng.randint(2022, 2026),
+        "description": " ".join(rng.choices(TITLE_WORDS, k=rng.randint(8, 40))),
+        "college": rng.choice(COLLEGES),
+        "filename": rng.choice(filenames),
+    }
+
+
+def fake_rating(rng: random.Random) -> dict:
+    return {
+        "teacher_name": rng.choice(TEACHERS),
+        "subject": rng.choice(SUBJECTS),
+        "rating": rng.randint(1, 5),
+        "feedback": " ".join(rng.choices(TITLE_WORDS, k=12)),
+        "user_email": f"user{rng.randint(0, 999)}@bench.local",
+        "date": (date(2026, 2, 17) - timedelta(days=rng.randint(0, 365))).isoformat(),
+    }
+
+
+async def seed(db, storage_dir: str, args) -> dict:
+    """Insert the synthetic corpus and write the files downloads will read."""
+    from passlib.context import CryptContext
+
+    rng = random.Random(args.seed)
+    os.makedirs(storage_dir, exist_ok=True)
+    filenames = []
+    for i in range(args.files):
+        name = f"bench_{i:04d}.pdf"
+        with open(os.path.join(storage_dir, name), "wb") as f:
+            f.write(DUMMY_PDF + os.urandom(args.file_kb * 1024))
+        filenames.append(name)
+
+    batch = 5000
+    for start in range(0, args.resources, batch):
+        await db.resources.insert_many([fake_resource(rng, filenames) for _ in range(min(batch, args.resources - start))])
+    for start in range(0, args.ratings, batch):
+        await db.reviews.insert_many([fake_rating(rng) for _ in range(min(batch, args.ratings - start))])
+    # bcrypt is slow on purpose; every benchmark user shares one hash
+    hashed = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    users = [
+        {"email": f"user{i}@bench.local", "name": f"User {i}", "password": hashed, "college": rng.choice(COLLEGES)}
+        for i in range(args.users)
+    ]
+    if users:
+        await db.users.insert_many(users)
+    return {"resources": args.resources, "ratings": args.ratings, "users": args.users, "files": filenames}
+
+
+def make_request(scenario: str, rng: random.Random, files, users: int):
+    """(method, path, kwargs) for one request of a scenario."""
+    if scenario == "resources":
+        params = {}
+        if rng.random() < 0.5:
+            params["course"] = ",".join(rng.sample(COURSES, rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            params["semester"] = rng.randint(1, 8)
+        if rng.random() < 0.3:
+            params["year"] = rng.randint(2022, 2026)
+        return "GET", "/api/resources", {"params": params}
+    if scenario == "resources_search":
+        term = rng.choice(TITLE_WORDS).lower()
+        # As-you-type: often only a prefix of the word
+        term = term[:rng.randint(3, len(term))]
+        return "GET", "/api/resources", {"params": {"search": term}}
+    if scenario == "ratings":
+        params = {"teacher_name": rng.choice(TEACHERS)} if rng.random() < 0.5 else {}
+        return "GET", "/api/ratings", {"params": params}
+    if scenario == "download":
+        return "GET", f"/api/download/{rng.choice(files)}", {}
+    if scenario == "upload":
+        content = DUMMY_PDF + uuid.uuid4().bytes * 64
+        return "POST", "/api/upload", {
+            "files": {"file": ("bench.pdf", content, "application/pdf")},
+            "data": {"title": "Benchmark upload", "course": rng.choice(COURSES), "author": "bench", "type": "Notes"},
+        }
+    if scenario == "login":
+        return "POST", "/api/token", {
+            "data": {"username": f"user{rng.randint(0, max(users, 1) - 1)}@bench.local", "password": PASSWORD},
+        }
+    raise ValueError(scenario)
+
+
+async def run_scenario(client, scenario: str, args, files) -> dict:
+    rng = random.Random(f"{args.seed}-{scenario}")
+    total = args.login_requests if scenario == "login" else args.requests
+    latencies, errors, issued = [], 0, 0
+    statuses = {}
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            issued += 1
+            method, path, kwargs = make_request(scenario, rng, files, args.users)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                await response.aread()
+                status = response.status_code
+            except Exception:
+                status = 0
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 0 or status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "rss_mb": rss_mb(),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    import httpx
+
+    rss_start = rss_mb()
+    app = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+        files = [f"bench_{i:04d}.pdf" for i in range(args.files)]
+    else:
+        storage_dir = tempfile.mkdtemp(prefix="bench_storage_")
+        os.environ["STORAGE_DIR"] = storage_dir
+        if args.no_cache:
+            os.environ["CACHE_TTL_S"] = "0"
+        if not args.rate_limits:
+            # Every simulated client shares one address; keep runs comparable across commits
+            os.environ["RATE_LIMIT_ENABLED"] = "false"
+        if args.mock:
+            # mongomock has no change streams; "auto" would retry watch() forever
+            os.environ["LIVE_UPDATES_MODE"] = "poll"
+        if args.mongo_url:
+            os.environ["MONGODB_URL"] = args.mongo_url
+            os.environ["DATABASE_NAME"] = args.database
+        import database
+        import main as app_module
+
+        if args.mock:
+            from mongomock_motor import AsyncMongoMockClient
+
+            # One client for the whole run: startup connects again after seeding,
+            # and a fresh mongomock client would start out empty
+            mock_client = AsyncMongoMockClient()
+
+            async def connect_to_mock():
+                database.db_helper.client = mock_client
+                database.db_helper.db = mock_client[args.database]
+            app_module.connect_to_mongo = connect_to_mock
+            await connect_to_mock()
+            seeded = await seed(database.get_db(), storage_dir, args)
+        else:
+            await database.connect_to_mongo()
+            if database.get_db() is None:
+                raise SystemExit("Could not connect to MongoDB")
+            seeded = await seed(database.get_db(), storage_dir, args) if args.seed_first else None
+        files = seeded["files"] if seeded else [f"bench_{i:04d}.pdf" for i in range(args.files)]
+
+        app = app_module
+        await app.startup_db_client()
+        # Let the search index finish its first build before measuring
+        for _ in range(600):
+            if app.search_index.ready:
+                break
+            await asyncio.sleep(0.1)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench", timeout=60)
+
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            results[scenario] = await run_scenario(client, scenario, args, files)
+            print(f"{scenario}: {results[scenario]['p50_ms']} ms p50, {results[scenario]['throughput_rps']} req/s",
+                  file=sys.stderr)
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.shutdown_db_client()
+
+    return {
+        "revision": git_revision(),
+        "mode": "http" if args.base_url else ("mock" if args.mock else "mongod"),
+        "config": {
+            "resources": args.resources, "ratings": args.ratings, "users": args.users,
+            "concurrency": args.concurrency, "requests": args.requests, "cache": not args.no_cache,
+            "rate_limits": args.rate_limits,
+        },
+        "scenarios": results,
+        "rss_mb": {"start": rss_start, "end": rss_mb()},
+    }
+
+
+async def seed_only(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=5000)
+    storage_dir = args.storage_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resource_storage")
+    try:
+        seeded = await seed(client[args.database], storage_dir, args)
+        print(f"Seeded {seeded['resources']} resources, {seeded['ratings']} ratings, {seeded['users']} users.")
+    finally:
+        client.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("seed", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--mongo-url", default=None if name == "run" else "mongodb://localhost:27017")
+        p.add_argument("--database", default="campus_resource_hub_bench")
+        p.add_argument("--resources", type=int, default=10000)
+        p.add_argument("--ratings", type=int, default=20000)
+        p.add_argument("--users", type=int, default=1000)
+        p.add_argument("--files", type=int, default=20, help="distinct files downloads are spread over")
+        p.add_argument("--file-kb", type=int, default=256)
+        p.add_argument("--seed", type=int, default=42)
+    seed_p = sub.choices["seed"]
+    seed_p.add_argument("--storage-dir", default=None)
+    run_p = sub.choices["run"]
+    run_p.add_argument("--mock", action="store_true", help="use mongomock-motor in-process")
+    run_p.add_argument("--base-url", default=None, help="benchmark a running server instead")
+    run_p.add_argument("--seed-first", action="store_true", help="seed the mongod before running in-process")
+    run_p.add_argument("--concurrency", type=int, default=32)
+    run_p.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    run_p.add_argument("--login-requests", type=int, default=200, help="login is bcrypt-bound; fewer by default")
+    run_p.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    run_p.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    run_p.add_argument("--rate-limits", action="store_true", help="keep per-client rate limits on")
+    run_p.add_argument("--output", default=None, help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "seed":
+        asyncio.run(seed_only(args))
+        return
+    if not (args.mock or args.mongo_url or args.base_url):
+        raise SystemExit("run needs one of --mock, --mongo-url or --base-url")
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import aiofiles.os
+from bson import ObjectId
+from fastapi import UploadFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from cache import TTLCache
+from content_encoding import variant_paths
+from database import acquire_lease, get_db, settings
+from file_serving import CONTENT_ADDRESSED, response_type
+from processing import THUMBNAIL_DIR
+from upload_pipeline import StoredUpload, extension_for, hash_upload, stream_upload
+
+# Counting a reference waits this many times 50 ms for a blob being deleted before giving up
+BLOB_REF_ATTEMPTS = 100
+# Staged uploads younger than this are left to the write queue's own commit
+STAGED_GRACE_S = 60
+# A deletion tombstone older than this was left by a crashed release
+BLOB_DELETE_TIMEOUT_S = 30
+# Evict down to this fraction of the limit, so eviction runs in batches
+EVICT_TO = 0.9
+# Last-access times are written to the file's atime at most this often
+TOUCH_INTERVAL_S = 60
+
+
+class BlobStore:
+    """Content-addressed file storage with reference counting.
+
+    Files live in `root` as `<sha256><ext>`. The `blobs` collection keeps one
+    document per hash ({_id: sha256, filename, size, refs}) so identical
+    uploads share a single file on disk and the file is only removed once the
+    last resource pointing at it is deleted. References are counted when the
+    resource document is inserted, not at upload time (see put).
+
+    With a cold tier (`object_store.create_object_store`), `root` becomes a
+    size-bounded cache: a background task copies every blob to the object
+    store (`remote: true` on its document), and once local files exceed
+    `storage_local_max_mb` the least recently read ones that are safely
+    remote are deleted locally. Reads of an evicted file fetch it back
+    (or, optionally, redirect to a presigned URL). Recency is the file's
+    atime, set on access, so every worker sharing the directory sees it.
+    """
+
+    def __init__(self, root: str, cold=None):
+        self.root = root
+        self.cold = cold
+        self.max_local_bytes = settings.storage_local_max_mb * 1024 * 1024
+        self._warming: Dict[str, asyncio.Future] = {}
+        self._touched = TTLCache(100000, TOUCH_INTERVAL_S)
+        self._task: Optional[asyncio.Task] = None
+        self.offloaded = 0
+        self.evicted = 0
+        self.warmed = 0
+        self.local_bytes = 0
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.root, filename)
+
+    async def _add_ref(self, db, sha256: str, filename: str, size: int, content_type: str) -> Optional[dict]:
+        for _ in range(BLOB_REF_ATTEMPTS):
+            try:
+                # Never count a reference on a blob whose deletion has started
+                return await db.blobs.find_one_and_update(
+                    {"_id": sha256, "deleting": {"$exists": False}},
+                    {"$inc": {"refs": 1}, "$setOnInsert": {"filename": filename, "size": size, "content_type": content_type}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # The last reference is being released; wait for its files to go.
+                # A tombstone left by a crashed release is cleared once it is stale.
+                await db.blobs.delete_one({"_id": sha256, "deleting": {"$lt": time.time() - BLOB_DELETE_TIMEOUT_S}})
+                await asyncio.sleep(0.05)
+        return None
+
+    async def put(self, file: UploadFile) -> StoredUpload:
+        """Store an upload under its hash without touching the database.
+
+        The bytes are also hard-linked under a private staging name, which
+        the resource document carries as `staged_blob`. The reference is
+        counted by commit_staged once the document has been inserted, so
+        uploads neither wait on nor fail with the database; until then the
+        staging link keeps the bytes even if the blob's last other reference
+        is released and its file removed.
+        """
+        sha256, size, content_type = await hash_upload(file)
+        # The extension follows the sniffed type so downloads can be typed from the name alone
+        filename = f"{sha256}{extension_for(content_type, file.filename)}"
+        path = self.path(filename)
+        staged = f".{sha256}.{uuid.uuid4().hex}.staged"
+        try:
+            os.link(path, self.path(staged))
+            deduplicated = True
+        except FileNotFoundError:
+            deduplicated = False
+
+        if deduplicated:
+            await file.close()
+        else:
+            await stream_upload(file, self.root, filename=staged)
+            try:
+                os.link(self.path(staged), path)
+            except FileExistsError:
+                pass  # the same bytes were stored concurrently
+            except BaseException:
+                os.remove(self.path(staged))
+                raise
+        return StoredUpload(filename, path, sha256, size, deduplicated=deduplicated,
+                            content_type=content_type, staged=staged)
+
+    async def commit_staged(self, db, resource: dict) -> bool:
+        """Count the blob reference of a resource stored by put().
+
+        Safe to repeat and to race: only the caller that clears `staged_blob`
+        keeps its reference, every other one (including all calls for a
+        resource deleted meanwhile) releases it again. Returns False if the
+        blob stayed tombstoned, to be retried later.
+        """
+        staged = resource["staged_blob"]
+        staged_path = self.path(staged)
+        blob = await self._add_ref(db, resource["sha256"], resource["filename"],
+                                   resource.get("size"), resource.get("content_type"))
+        if blob is None:
+            return False
+        # The file may have gone with the blob's previous last reference
+        path = self.path(blob["filename"])
+        if not blob.get("remote") and not await aiofiles.os.path.exists(path):
+            try:
+                os.link(staged_path, path)
+            except (FileExistsError, FileNotFoundError):
+                pass
+        result = await db.resources.update_one(
+            {"_id": resource["_id"], "staged_blob": staged},
+            {"$set": {"filename": blob["filename"]}, "$unset": {"staged_blob": ""}},
+        )
+        if result.matched_count == 0:
+            await self.release(resource["sha256"])
+        # An earlier upload may have used a different extension; the resource now uses its file
+        for name in {staged, resource["filename"]} - {blob["filename"]}:
+            try:
+                await aiofiles.os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+        return True
+
+    async def commit_inserted(self, docs: List[dict]) -> None:
+        """WriteBehindQueue hook: count the references of a batch just inserted."""
+        db = get_db()
+        staged = [doc for doc in docs if doc.get("staged_blob")]
+        results = await asyncio.gather(*(self.commit_staged(db, doc) for doc in staged), return_exceptions=True)
+        for doc, result in zip(staged, results):
+            if isinstance(result, Exception):
+                # Left for commit_pending
+                print(f"Blob reference for {doc['_id']} not counted: {result}")
+
+    async def commit_pending(self, db, limit: int = 500) -> int:
+        """Count references still staged after an outage or a crash between insert and commit."""
+        cutoff = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=STAGED_GRACE_S))
+        docs = await db.resources.find(
+            {"staged_blob": {"$exists": True}, "_id": {"$lt": cutoff}},
+            {"sha256": 1, "filename": 1, "size": 1, "content_type": 1, "staged_blob": 1},
+        ).to_list(limit)
+        committed = 0
+        for doc in docs:
+            committed += await self.commit_staged(db, doc)
+        return committed
+
+    async def release(self, sha256: str) -> bool:
+        """Drop one reference to a blob; delete the file when none remain.
+
+        Returns True if the file was removed from disk.
+        """
+        db = get_db()
+        if db is None:
+            return False
+        blob = await db.blobs.find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not blob or blob.get("refs", 0) > 0:
+            return False
+        # Tombstone before touching the files: put() stops reusing the blob, a
+        # concurrent put() that already re-referenced it makes this match nothing,
+        # and only one releasing caller wins
+        started = time.time()
+        blob = await db.blobs.find_one_and_update(
+            {"_id": sha256, "refs": {"$lte": 0}, "deleting": {"$exists": False}},
+            {"$set": {"deleting": started}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is None:
+            return False
+        paths = [self.path(blob["filename"]), os.path.join(self.root, THUMBNAIL_DIR, f"{sha256}.png")]
+        for path in paths + variant_paths(self.root, blob["filename"]):
+            if await aiofiles.os.path.exists(path):
+                await aiofiles.os.remove(path)
+        if self.cold is not None and blob.get("remote"):
+            try:
+                await self.cold.delete(blob["filename"])
+            except Exception as e:
+                print(f"Cold storage delete failed ({blob['filename']}): {e}")
+        await db.blobs.delete_one({"_id": sha256, "deleting": started})
+        return True
+
+    async def remove_resource_file(self, resource: dict) -> None:
+        """Release the storage held by a resource document."""
+        if resource.get("staged_blob"):
+            # Deleted before its reference was counted: counting it now releases it again
+            db = get_db()
+            if db is not None and not await self.commit_staged(db, resource):
+                print(f"Blob {resource['sha256']} still being removed; staged upload kept")
+        elif resource.get("sha256"):
+            await self.release(resource["sha256"])
+        elif resource.get("filename"):
+            # Legacy uploads stored under a random name are owned by one resource
+            path = self.path(resource["filename"])
+            if await aiofiles.os.path.exists(path):
+                await aiofiles.os.remove(path)
+
+    # Tiering
+
+    def _touch(self, path: str):
+        """Record a read as the file's atime (mtime, and so Last-Modified, is kept)."""
+        if path in self._touched:
+            return
+        self._touched.set(path, True)
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    async def local_path(self, filename: str) -> Optional[str]:
+        """Path of a stored file on local disk, fetched back from the cold tier if evicted.
+
+        Returns None if the file exists in neither tier.
+        """
+        path = self.path(filename)
+        if await aiofiles.os.path.exists(path):
+            if self.cold is not None:
+                self._touch(path)
+            return path
+        if self.cold is None or not CONTENT_ADDRESSED.match(filename):
+            return None
+        # Concurrent readers of the same cold file share one fetch
+        warming = self._warming.get(filename)
+        if warming is None:
+            warming = self._warming[filename] = asyncio.ensure_future(self._warm(filename, path))
+            warming.add_done_callback(lambda _: self._warming.pop(filename, None))
+        return path if await asyncio.shield(warming) else None
+
+    async def _warm(self, filename: str, path: str) -> bool:
+        tmp_path = os.path.join(self.root, f".{uuid.uuid4()}.part")
+        try:
+            if not await self.cold.fetch(filename, tmp_path):
+                return False
+            await aiofiles.os.replace(tmp_path, path)
+        finally:
+            if await aiofiles.os.path.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
+        self.warmed += 1
+        self._touch(path)
+        return True
+
+    def presigned_url(self, filename: str) -> Optional[str]:
+        """A short-lived direct link to an evicted file, when the cold tier supports it."""
+        if self.cold is None or not settings.storage_presigned_redirects or not CONTENT_ADDRESSED.match(filename):
+            return None
+        content_type, disposition = response_type(filename)
+        return self.cold.presigned_url(filename, settings.storage_presign_ttl_s, content_type, disposition)
+
+    async def offload(self, db, limit: int = 100) -> int:
+        """Copy blobs that exist only locally to the cold tier."""
+        copied = 0
+        async for blob in db.blobs.find({"remote": {"$ne": True}, "refs": {"$gt": 0}}).limit(limit):
+            path = self.path(blob["filename"])
+            if not await aiofiles.os.path.exists(path):
+                continue  # still being written, or an upload that failed
+            await self.cold.put(blob["filename"], path, blob.get("content_type"))
+            result = await db.blobs.update_one({"_id": blob["_id"]}, {"$set": {"remote": True}})
+            if result.matched_count == 0:
+                # Released while we were copying: don't leave an orphan behind
+                await self.cold.delete(blob["filename"])
+                continue
+            copied += 1
+        self.offloaded += copied
+        return copied
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        with os.scandir(self.root) as entries:
+            return {
+                e.name: e.stat(follow_symlinks=False)
+                for e in entries if e.is_file(follow_symlinks=False) and CONTENT_ADDRESSED.match(e.name)
+            }
+
+    async def evict(self, db) -> int:
+        """Delete the least recently read remote copies until local use is under the limit."""
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, self._scan)
+        self.local_bytes = sum(st.st_size for st in stats.values())
+        if not self.max_local_bytes or self.local_bytes <= self.max_local_bytes:
+            return 0
+        target = self.max_local_bytes * EVICT_TO
+        candidates = sorted(stats, key=lambda name: stats[name].st_atime)
+        evicted = 0
+        for start in range(0, len(candidates), 500):
+            if self.local_bytes <= target:
+                break
+            batch = candidates[start:start + 500]
+            shas = [CONTENT_ADDRESSED.match(name).group(1) for name in batch]
+            remote = {doc["filename"] async for doc in db.blobs.find({"_id": {"$in": shas}, "remote": True}, {"filename": 1})}
+            for name in batch:
+                if self.local_bytes <= target:
+                    break
+                if name not in remote:
+                    continue  # not copied to the cold tier yet
+                for path in [self.path(name)] + variant_paths(self.root, name):
+                    try:
+                        await aiofiles.os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self.local_bytes -= stats[name].st_size
+                evicted += 1
+        self.evicted += evicted
+        return evicted
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.storage_sweep_interval_s)
+            db = get_db()
+            if db is None:
+                continue
+            try:
+                if await acquire_lease(db, "blob_refs", settings.storage_sweep_interval_s * 0.9):
+                    while await self.commit_pending(db) > 0:
+                        pass
+            except Exception as e:
+                print(f"Blob reference sweep error: {e}")
+            if self.cold is None:
+                continue
+            try:
+                while await self.offload(db) > 0:
+                    pass
+                # Workers share the directory: one of them sweeps per interval
+                if await acquire_lease(db, "storage_evict", settings.storage_sweep_interval_s * 0.9):
+                    await self.evict(db)
+            except Exception as e:
+                print(f"Storage tiering error: {e}")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.cold is not None:
+            self.cold.close()
+
+    def stats(self) -> dict:
+        return {
+            "cold_tier": type(self.cold).__name__ if self.cold is not None else None,
+            "local_bytes": self.local_bytes,
+            "local_limit_bytes": self.max_local_bytes,
+            "offloaded": self.offloaded,
+            "evicted": self.evicted,
+            "warmed": self.warmed,
+        }
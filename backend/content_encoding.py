@@ -0,0 +1,256 @@
+import asyncio
+import gzip
+import mimetypes
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import settings
+import metrics
+
+# brotli and zstandard are optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compression_cpu = metrics.registry.counter(
+    "compression_cpu_seconds_total", "CPU time spent compressing responses.", ("encoding", "kind"))
+compression_bytes_in = metrics.registry.counter(
+    "compression_input_bytes_total", "Bytes before compression.", ("encoding", "kind"))
+compression_bytes_out = metrics.registry.counter(
+    "compression_output_bytes_total", "Bytes after compression.", ("encoding", "kind"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/xml", "application/javascript", "image/svg+xml")
+# Precompressed copies of downloadable files, next to the originals
+VARIANT_DIR = "encoded"
+VARIANT_SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+
+
+def variant_paths(root: str, filename: str) -> List[str]:
+    """Every precompressed copy a stored file may have."""
+    return [os.path.join(root, VARIANT_DIR, filename + suffix) for suffix in VARIANT_SUFFIXES.values()]
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data: bytes, level: int) -> bytes:
+    # Text mode tunes the context modelling for UTF-8
+    return brotli.compress(data, mode=brotli.MODE_TEXT, quality=level)
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+CODECS: Dict[str, Callable[[bytes, int], bytes]] = {"gzip": _gzip}
+if brotli is not None:
+    CODECS["br"] = _brotli
+if zstandard is not None:
+    CODECS["zstd"] = _zstd
+
+
+def available_encodings() -> List[str]:
+    """Configured encodings that can actually be produced, in server preference order."""
+    return [e.strip() for e in settings.compression_encodings.split(",") if e.strip() in CODECS]
+
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """Pick the client's highest-q encoding, ties broken by our order; None for identity."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def accepted_encoding(scope: Scope, encodings: List[str]) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            return negotiate(value.decode("latin-1"), encodings)
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+def compress(data: bytes, encoding: str, level: int, kind: str) -> bytes:
+    """Compress and account for the CPU time and the bytes saved."""
+    started = time.thread_time()
+    out = CODECS[encoding](data, level)
+    compression_cpu.inc(encoding, kind, amount=time.thread_time() - started)
+    compression_bytes_in.inc(encoding, kind, amount=len(data))
+    compression_bytes_out.inc(encoding, kind, amount=len(out))
+    return out
+
+
+def dynamic_level(encoding: str) -> int:
+    return {
+        "gzip": settings.compression_gzip_level,
+        "br": settings.compression_brotli_level,
+        "zstd": settings.compression_zstd_level,
+    }[encoding]
+
+
+def _add_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[i] = (name, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli/zstd for API responses above a size threshold.
+
+    Only single-message bodies with a text-like content type are compressed
+    (every JSON response here). Streaming responses such as SSE, file
+    responses (they advertise Accept-Ranges and bring their own
+    precompressed variants), already-encoded and partial responses pass
+    through untouched. Sits inside the response cache, which keys entries by
+    the negotiated encoding, so a cached list is compressed once per
+    encoding rather than once per request.
+    """
+
+    def __init__(self, app: ASGIApp, encodings: List[str]):
+        self.app = app
+        self.encodings = encodings
+        self.min_bytes = settings.compression_min_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(scope, self.encodings)
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def compressing_send(message: Message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (message["status"] in (204, 206, 304) or not is_compressible(content_type)
+                        or b"content-encoding" in headers or b"accept-ranges" in headers):
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = _add_vary(list(start.get("headers", [])))
+            if message.get("more_body", False) or encoding is None or len(body) < self.min_bytes:
+                # Streaming, not accepted, or too small to be worth it
+                passthrough = True
+                await send({**start, "headers": headers})
+                await send(message)
+                return
+            body = compress(body, encoding, dynamic_level(encoding), "dynamic")
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+class PrecompressedFiles:
+    """Compressed copies of downloadable text-like files, made once and reused.
+
+    The first download of a file is served as is while the copies are
+    written in the background at the highest levels (the cost is paid once
+    per file, not per request). Later downloads that accept one of the
+    encodings get the stored copy.
+    """
+
+    def __init__(self, root: str, encodings: List[str]):
+        self.root = root
+        self.encodings = encodings
+        self.built = 0
+        self._building: Dict[str, asyncio.Task] = {}
+        # Files that don't shrink, so we stop trying
+        self._incompressible: Set[str] = set()
+
+    def path(self, filename: str, encoding: str) -> str:
+        return os.path.join(self.root, VARIANT_DIR, filename + VARIANT_SUFFIXES[encoding])
+
+    def eligible(self, filename: str, size: int) -> bool:
+        content_type = mimetypes.guess_type(filename)[0] or ""
+        return (bool(self.encodings) and is_compressible(content_type)
+                and settings.compression_min_bytes <= size <= settings.compression_precompress_max_mb * 1024 * 1024)
+
+    def variant(self, scope: Scope, filename: str, source: str) -> Optional[Tuple[str, str]]:
+        """(encoding, path) of a stored copy the client accepts; schedules building missing ones."""
+        try:
+            size = os.stat(source).st_size
+        except OSError:
+            return None
+        if not self.eligible(filename, size):
+            return None
+        encoding = accepted_encoding(scope, self.encodings)
+        if encoding is None:
+            return None
+        path = self.path(filename, encoding)
+        if os.path.exists(path):
+            return encoding, path
+        if filename not in self._building and filename not in self._incompressible:
+            task = asyncio.create_task(self._build(filename, source))
+            self._building[filename] = task
+            task.add_done_callback(lambda _: self._building.pop(filename, None))
+        return None
+
+    def _build_sync(self, filename: str, source: str):
+        os.makedirs(os.path.join(self.root, VARIANT_DIR), exist_ok=True)
+        with open(source, "rb") as f:
+            data = f.read()
+        levels = {"gzip": 9, "br": 11, "zstd": 19}
+        for encoding in self.encodings:
+            out = compress(data, encoding, levels[encoding], "static")
+            if len(out) >= len(data) * 0.9:
+                # Not worth it; the original is served
+                self._incompressible.add(filename)
+                continue
+            tmp_path = os.path.join(self.root, VARIANT_DIR, f".{uuid.uuid4()}.part")
+            with open(tmp_path, "wb") as f:
+                f.write(out)
+            os.replace(tmp_path, self.path(filename, encoding))
+
+    async def _build(self, filename: str, source: str):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._build_sync, filename, source)
+            self.built += 1
+        except Exception as e:
+            print(f"Precompression failed ({filename}): {e}")
+
+    def stats(self) -> dict:
+        return {"built": self.built, "building": len(self._building), "incompressible": len(self._incompressible)}
@@ -1,47 +1,291 @@
+import asyncio
 import os
+import socket
+import time
+from typing import Awaitable, Callable, List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
+from pymongo.errors import DuplicateKeyError
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
+    # serve.py: workers=0 means one per CPU core; open requests get this long to finish on SIGTERM
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0
+    graceful_timeout_s: int = 30
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "campus_resource_hub"
     cloudinary_cloud_name: str = ""
     cloudinary_api_key: str = ""
     cloudinary_api_secret: str = ""
+    # Connection pool; requests waiting longer than the queue timeout for a socket fail fast
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_wait_queue_timeout_ms: int = 5000
+    # If the first connection fails, retry in the background with exponential backoff
+    mongo_reconnect_initial_s: float = 1.0
+    mongo_reconnect_max_s: float = 30.0
+    # Read preference for read-only endpoints (primary, primaryPreferred, secondary,
+    # secondaryPreferred, nearest); secondaries may serve slightly stale lists
+    mongo_read_preference: str = "primary"
+    # Where uploaded files live; empty means ../resource_storage next to the backend
+    storage_dir: str = ""
+    # Cold tier for stored files: "" (local only), "s3" (any S3-compatible store) or
+    # "directory" (e.g. an NFS mount). Files are copied there in the background; the
+    # local directory then keeps at most storage_local_max_mb (0 = no limit) of the
+    # most recently read ones and fetches evicted files back on demand
+    storage_cold_backend: str = ""
+    storage_cold_dir: str = ""
+    storage_local_max_mb: int = 0
+    storage_sweep_interval_s: int = 60
+    # Send downloads of evicted files straight to the object store instead of fetching them
+    storage_presigned_redirects: bool = False
+    storage_presign_ttl_s: int = 300
+    s3_endpoint_url: str = ""
+    s3_region: str = ""
+    s3_bucket: str = "campus-resource-hub"
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    # Uploads are streamed to disk in fixed-size chunks; files above the cap are rejected
+    upload_chunk_size: int = 1024 * 1024
+    max_upload_size_mb: int = 250
+    # Files of one bulk upload hashed/written concurrently
+    bulk_upload_concurrency: int = 8
+    bulk_upload_max_files: int = 100
+    # Whole request body of a bulk upload, checked while it is received
+    max_bulk_upload_size_mb: int = 1024
+    # Operations accepted in one /api/resources/bulk request
+    bulk_max_operations: int = 500
+    # Background PDF processing (text extraction, thumbnails) in a process pool
+    processing_workers: int = 2
+    processing_max_attempts: int = 3
+    processing_retry_s: float = 2.0
+    extracted_text_max_chars: int = 20000
+    # Only a few distinct key terms of it are searchable: the in-process index keeps every token of every resource
+    search_terms_per_document: int = 24
+    # An extraction running longer fails the attempt and its worker process is replaced
+    processing_timeout_s: float = 120
+    # Unfinished jobs are re-queued by one worker per lease period after a (re)start
+    processing_resume_lease_s: int = 60
+    # Write-behind queue for resource metadata (coalesced into insert_many batches)
+    write_flush_interval_ms: int = 200
+    write_batch_size: int = 500
+    # In-process search index is rebuilt from the resources collection on this interval
+    search_index_refresh_s: int = 300
+    # List endpoints: default and maximum page size
+    page_size_default: int = 100
+    page_size_max: int = 500
+    # Only one worker (per lease period) creates indexes when several start together
+    index_bootstrap_lease_s: int = 30
+    # Explain the main queries at startup and report any that fall back to COLLSCAN
+    index_diagnostics: bool = False
+    # bcrypt runs on a bounded thread pool; callers beyond the queue limit get 503
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    # Emails that failed lookup are remembered briefly so repeated attempts skip Mongo
+    unknown_email_cache_size: int = 10000
+    unknown_email_cache_ttl_s: int = 60
+    # Verified JWT claims and user profiles served by the current_user dependency
+    token_cache_size: int = 10000
+    profile_cache_size: int = 10000
+    profile_cache_ttl_s: int = 30
+    # Download counts are buffered in memory and flushed as bulk $inc updates
+    counter_flush_interval_s: float = 5.0
+    # Response cache for read-heavy list endpoints ("memory" or "redis")
+    cache_backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    cache_ttl_s: int = 30
+    cache_max_entries: int = 2048
+    cache_max_entry_kb: int = 1024
+    # Negotiated response compression for JSON above the size threshold, in server
+    # preference order (br/zstd need the brotli/zstandard packages). Levels are for
+    # per-request compression; precompressed copies of text downloads use the maximum
+    compression_enabled: bool = True
+    compression_encodings: str = "zstd,br,gzip"
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 5
+    compression_brotli_level: int = 4
+    compression_zstd_level: int = 3
+    compression_precompress_max_mb: int = 32
+    # Rate limits: token buckets per user/IP for each route class ("memory" or "redis")
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_max_clients: int = 100000
+    # Only behind a trusted reverse proxy: take the client IP from X-Forwarded-For
+    rate_limit_trust_proxy: bool = False
+    rate_limit_auth_per_min: int = 20
+    rate_limit_auth_burst: int = 10
+    rate_limit_upload_per_min: int = 30
+    rate_limit_upload_burst: int = 10
+    rate_limit_search_per_min: int = 240
+    rate_limit_search_burst: int = 60
+    # A bulk upload carries up to bulk_upload_max_files files, so it has its own, much smaller budget
+    rate_limit_bulk_upload_per_min: int = 4
+    rate_limit_bulk_upload_burst: int = 2
+    # Admission control: concurrent uploads/searches per worker, extra callers may
+    # queue up to admission_max_queue deep before getting 503 (bcrypt has its own cap)
+    upload_max_concurrent: int = 16
+    search_max_concurrent: int = 32
+    bulk_upload_max_concurrent: int = 2
+    admission_max_queue: int = 64
+    # Trending rankings: time-decayed download/view scores, top-k per segment in memory,
+    # checkpointed to the `trending` collection and reloaded from it periodically
+    trending_half_life_h: float = 72.0
+    trending_top_k: int = 100
+    trending_checkpoint_s: int = 60
+    trending_refresh_s: int = 300
+    # Live updates over SSE: "auto" reads a change stream and falls back to polling for
+    # new documents on a standalone mongod ("change_stream", "poll" or "off" to force)
+    live_updates_mode: str = "auto"
+    live_poll_interval_s: float = 2.0
+    live_poll_lookback_s: float = 30.0
+    # Per-connection backlog; a client that falls this far behind is told to resync
+    live_queue_size: int = 256
+    live_heartbeat_s: float = 15.0
+    # /metrics: request latency histograms, Mongo command timings (sampled) and loop lag
+    metrics_enabled: bool = True
+    metrics_mongo_sample_rate: float = 0.1
+    metrics_loop_lag_interval_s: float = 0.5
 
     class Config:
         env_file = ".env"
 
 settings = Settings()
 
+# read_preference names accepted by the mongo_read_preference setting
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     db = None
+    # Same database, routed per mongo_read_preference; used by read-only endpoints
+    read_db = None
 
 db_helper = MongoDB()
 
-async def connect_to_mongo():
+_reconnect_task: Optional[asyncio.Task] = None
+_reconnect_listeners: List[Callable[[object], Awaitable[None]]] = []
+_closed = False
+
+def add_reconnect_listener(callback: Callable[[object], Awaitable[None]]):
+    """Run `callback(db)` whenever a connection is established after a failed start."""
+    _reconnect_listeners.append(callback)
+
+def _create_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        settings.mongodb_url,
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+    )
+
+async def _try_connect() -> bool:
     try:
-        print(f"Attempting to connect to MongoDB: {settings.mongodb_url.split('@')[-1]}") # Log without creds
-        db_helper.client = AsyncIOMotorClient(
-            settings.mongodb_url,
-            serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000
-        )
+        # The client itself survives outages (it keeps monitoring the servers);
+        # it is only rebuilt if creating it failed, e.g. an SRV lookup error
+        if db_helper.client is None:
+            db_helper.client = _create_client()
         # Force a connection check
         await db_helper.client.admin.command('ping')
-        db_helper.db = db_helper.client[settings.database_name]
-        print(f"✅ Connected to MongoDB database: {settings.database_name}")
     except Exception as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
-        # Initialize db as None to prevent crashes, but log the error
+        return False
+    db_helper.db = db_helper.client[settings.database_name]
+    read_preference = READ_PREFERENCES.get(settings.mongo_read_preference, ReadPreference.PRIMARY)
+    db_helper.read_db = db_helper.client.get_database(settings.database_name, read_preference=read_preference)
+    print(f"✅ Connected to MongoDB database: {settings.database_name}")
+    return True
+
+async def _reconnect():
+    delay = settings.mongo_reconnect_initial_s
+    while db_helper.db is None and not _closed:
+        await asyncio.sleep(delay)
+        if await _try_connect():
+            for callback in _reconnect_listeners:
+                try:
+                    await callback(db_helper.db)
+                except Exception as e:
+                    print(f"Reconnect listener error: {e}")
+            return
+        delay = min(delay * 2, settings.mongo_reconnect_max_s)
+
+def _schedule_reconnect():
+    global _reconnect_task
+    if _closed or (_reconnect_task is not None and not _reconnect_task.done()):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _reconnect_task = loop.create_task(_reconnect())
+
+async def connect_to_mongo():
+    global _closed
+    _closed = False
+    print(f"Attempting to connect to MongoDB: {settings.mongodb_url.split('@')[-1]}") # Log without creds
+    if not await _try_connect():
+        # Keep serving (degraded) and retry in the background with backoff
         db_helper.db = None
+        db_helper.read_db = None
+        _schedule_reconnect()
 
 async def close_mongo_connection():
+    global _closed, _reconnect_task
+    _closed = True
+    if _reconnect_task is not None:
+        _reconnect_task.cancel()
+        try:
+            await _reconnect_task
+        except asyncio.CancelledError:
+            pass
+        _reconnect_task = None
     if db_helper.client:
         db_helper.client.close()
         print("Closed MongoDB connection")
 
+async def ping(timeout: float = 2.0) -> bool:
+    """Round trip to the server, for readiness checks."""
+    db = db_helper.db
+    if db is None:
+        return False
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+        return True
+    except Exception:
+        return False
+
+async def acquire_lease(db, name: str, ttl_s: float) -> bool:
+    """True for exactly one caller across all workers/hosts until the lease expires."""
+    now = time.time()
+    try:
+        # Matches only an expired lease; otherwise the upsert collides on _id
+        await db.locks.update_one(
+            {"_id": name, "expires": {"$lt": now}},
+            {"$set": {"expires": now + ttl_s, "owner": f"{socket.gethostname()}:{os.getpid()}"}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
 def get_db():
+    if db_helper.db is None:
+        # Lazy reconnect: the first caller after a failed start kicks off retries
+        _schedule_reconnect()
     return db_helper.db
 
+def get_read_db():
+    """Database handle for read-only endpoints (may route to secondaries)."""
+    db = get_db()
+    if db is None or db_helper.read_db is None:
+        return db
+    return db_helper.read_db
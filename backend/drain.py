@@ -0,0 +1,50 @@
+import signal
+from typing import Callable, List
+
+
+class GracefulDrain:
+    """Notices SIGTERM/SIGINT before the server starts shutting down.
+
+    The server (uvicorn or a gunicorn worker) stops accepting connections on
+    the signal and waits for open requests before running the shutdown
+    handlers, which flush counters and write queues. Long-lived responses
+    such as SSE streams would keep it waiting until the graceful timeout, so
+    drain callbacks end them right away, and readiness reports `draining` so
+    a load balancer stops routing here. The server's own handler still runs.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._callbacks: List[Callable[[], None]] = []
+
+    def on_drain(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def begin(self):
+        if self.draining:
+            return
+        self.draining = True
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Drain callback error: {e}")
+
+    def install(self):
+        """Chain onto the current handlers; call after the server installed its own."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                previous = signal.getsignal(sig)
+
+                def handler(signum, frame, previous=previous):
+                    self.begin()
+                    if callable(previous):
+                        previous(signum, frame)
+                    elif previous == signal.SIG_DFL:
+                        signal.signal(signum, signal.SIG_DFL)
+                        signal.raise_signal(signum)
+
+                signal.signal(sig, handler)
+            except ValueError:
+                # Not the main thread (e.g. a test client): nothing to chain onto
+                return
@@ -0,0 +1,54 @@
+from typing import Dict, List
+
+# Filter chips on the Explore page, in display order
+FACET_FIELDS = ["course", "subject", "type", "semester", "year"]
+
+
+def facet_pipeline(filters: dict) -> List[dict]:
+    """One $facet aggregation counting every facet for the current filter set.
+
+    Counts are disjunctive: each facet ignores its own filter, so with
+    course=CS101 selected the course chips still show how many results
+    picking another course would add. Filters on non-facet fields (privacy,
+    search) are applied once, before the fan-out.
+    """
+    shared = {k: v for k, v in filters.items() if k not in FACET_FIELDS}
+    branches = {}
+    for field in FACET_FIELDS:
+        others = {k: v for k, v in filters.items() if k in FACET_FIELDS and k != field}
+        branch = [{"$match": others}] if others else []
+        branch += [
+            {"$match": {field: {"$nin": [None, ""]}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+        branches[field] = branch
+    pipeline = [{"$match": shared}] if shared else []
+    pipeline.append({"$facet": branches})
+    return pipeline
+
+
+def _bucket_order(bucket: dict):
+    value = bucket["_id"]
+    # Same order as the pipeline's $sort: count desc, then numbers before strings
+    return (-bucket["count"], (0, value, "") if isinstance(value, (int, float)) else (1, 0, str(value)))
+
+
+def facets_from_counts(counts: Dict[str, Dict[object, int]]) -> dict:
+    """Shape value -> count maps (from the search index) like the pipeline's result."""
+    return {
+        field: sorted(({"_id": value, "count": count} for value, count in counts.get(field, {}).items()),
+                      key=_bucket_order)
+        for field in FACET_FIELDS
+    }
+
+
+def format_facets(result: dict) -> dict:
+    return {
+        field: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result.get(field, [])]
+        for field in FACET_FIELDS
+    }
+
+
+def empty_facets() -> dict:
+    return {field: [] for field in FACET_FIELDS}
@@ -0,0 +1,210 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from content_encoding import is_compressible
+
+CHUNK_SIZE = 256 * 1024
+
+# Content-addressed blobs are named <sha256><ext>, so their bytes never change
+CONTENT_ADDRESSED = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, no-cache"
+# Types a browser displays without running anything. Everything else (HTML,
+# SVG, XML...) could carry script, so it is downloaded as opaque bytes rather
+# than rendered on our origin.
+INLINE_TYPES = frozenset({
+    "application/pdf", "text/plain", "image/png", "image/jpeg", "image/gif", "image/webp",
+    "audio/mpeg", "audio/ogg", "audio/wav", "video/mp4", "video/webm",
+})
+
+
+def check_servable(filename: str):
+    """404 for dot-files: upload temp files and write-queue journals share the storage root."""
+    if filename.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+
+
+def response_type(filename: str) -> Tuple[str, str]:
+    """(Content-Type, Content-Disposition) a stored file is served with."""
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if content_type in INLINE_TYPES:
+        return content_type, f'inline; filename="{filename}"'
+    return "application/octet-stream", f'attachment; filename="{filename}"'
+
+
+class FileRangeResponse(Response):
+    """Sends `count` bytes of a file starting at `offset`.
+
+    Uses the ASGI zero-copy extension (sendfile) when the server offers it,
+    `pathsend` for whole files on servers that support that instead, and
+    falls back to streaming fixed-size chunks otherwise.
+    """
+
+    def __init__(self, path: str, offset: int, count: int, status_code: int, headers: dict,
+                 send_body: bool = True):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body
+        self.status_code = status_code
+        self.background = None
+        self.body = b""
+        self.init_headers(headers)
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+        elif "http.response.pathsend" in extensions and self.offset == 0 and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": self.path})
+        else:
+            async with aiofiles.open(self.path, "rb") as f:
+                await f.seek(self.offset)
+                remaining = self.count
+                while remaining > 0:
+                    chunk = await f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # File shrank underneath us; close the response cleanly
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _etag(filename: str, stat_result: os.stat_result) -> str:
+    match = CONTENT_ADDRESSED.match(filename)
+    if match:
+        # Strong validator: the name is the SHA-256 of the content
+        return f'"{match.group(1)}"'
+    return f'W/"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into (start, end_inclusive).
+
+    Returns None when the header should be ignored (other units or several
+    ranges, which we answer with the full body) and raises 416 when it is
+    syntactically fine but unsatisfiable.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if start_s == "":
+            # Suffix range: the last N bytes
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+async def serve_file(request: Request, path: str, filename: str,
+                     encoded: Optional[Tuple[str, str]] = None) -> Response:
+    """Conditional, range-aware response for a stored resource file.
+
+    `encoded` is an optional (encoding, path) precompressed copy the client
+    accepts; it is sent whole, so range requests get the original bytes.
+    """
+    try:
+        stat_result = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    size = stat_result.st_size
+    etag = _etag(filename, stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    content_type, disposition = response_type(filename)
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "accept-ranges": "bytes",
+        "cache-control": IMMUTABLE_CACHE if CONTENT_ADDRESSED.match(filename) else REVALIDATE_CACHE,
+        "content-disposition": disposition,
+        "x-content-type-options": "nosniff",
+    }
+    # Precompressed copies follow the file's own type, whatever it is served as
+    if is_compressible(mimetypes.guess_type(filename)[0] or ""):
+        headers["vary"] = "Accept-Encoding"
+    if encoded is not None and not request.headers.get("range"):
+        encoding, encoded_path = encoded
+        try:
+            size = (await aiofiles.os.stat(encoded_path)).st_size
+            path = encoded_path
+            # Each representation needs its own validator
+            etag = headers["etag"] = f'{etag[:-1]}-{encoding}"'
+            headers["content-encoding"] = encoding
+        except FileNotFoundError:
+            pass
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and _etag_matches(if_none_match, etag)) or (
+            not if_none_match and if_modified_since and _not_modified_since(if_modified_since, stat_result.st_mtime)):
+        return Response(status_code=304, headers=headers)
+
+    headers["content-type"] = content_type
+    send_body = request.method != "HEAD"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range needs a strong validator (or the exact date) to resume a partial download
+    if_range_ok = not if_range or if_range == last_modified or (if_range == etag and not etag.startswith("W/"))
+    if range_header and if_range_ok:
+        byte_range = parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return FileRangeResponse(path, start, end - start + 1, 206, headers, send_body)
+
+    return FileRangeResponse(path, 0, size, 200, headers, send_body)
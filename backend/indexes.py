@@ -0,0 +1,124 @@
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database import acquire_lease, settings
+
+# Every filtered/sorted query in main.py with the index that serves it.
+# Resource list pages sort on _id, so filters are followed by _id to let the
+# index answer both the match and the keyset range without an in-memory sort.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "resources": [
+        # get_resources: course=... / course $in [...]
+        IndexModel([("course", ASCENDING), ("_id", ASCENDING)], name="course_id"),
+        # get_resources: subject=... / subject $in [...]
+        IndexModel([("subject", ASCENDING), ("_id", ASCENDING)], name="subject_id"),
+        # get_resources: type=... / type $in [...]
+        IndexModel([("type", ASCENDING), ("_id", ASCENDING)], name="type_id"),
+        # get_resources: semester=... (optionally with year=...)
+        IndexModel([("semester", ASCENDING), ("year", ASCENDING), ("_id", ASCENDING)], name="semester_year_id"),
+        # get_resources: year=...
+        IndexModel([("year", ASCENDING), ("_id", ASCENDING)], name="year_id"),
+        # get_resources: privacy=...
+        IndexModel([("privacy", ASCENDING), ("_id", ASCENDING)], name="privacy_id"),
+        # download_file: the resource(s) serving a file, to count a download against
+        IndexModel([("filename", ASCENDING)], name="filename"),
+        # ProcessingQueue.resume: unfinished jobs still under the attempt limit
+        IndexModel([("processing", ASCENDING), ("processing_attempts", ASCENDING)], name="processing_attempts"),
+        # BlobStore.commit_pending: uploads whose blob reference is not counted yet
+        IndexModel([("staged_blob", ASCENDING)], name="staged_blob", sparse=True),
+    ],
+    "reviews": [
+        # get_ratings: teacher_name=... sorted by date desc
+        IndexModel([("teacher_name", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)], name="teacher_date_id"),
+        # get_ratings: unfiltered, sorted by date desc
+        IndexModel([("date", DESCENDING), ("_id", DESCENDING)], name="date_id"),
+    ],
+    "events": [
+        # get_events: sorted by date
+        IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date_id"),
+    ],
+    "rating_stats": [
+        # get_rating_summary / get_teacher_rating_summary filter on the grouped key
+        IndexModel([("_id.teacher_name", ASCENDING), ("_id.subject", ASCENDING)], name="teacher_subject"),
+    ],
+    "trending": [
+        # TrendingRanker.load / checkpoint pruning: score range scans
+        IndexModel([("score", ASCENDING)], name="score"),
+    ],
+    "users": [
+        # login / get_profile / signup look users up by email; signup relies on uniqueness
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+}
+
+# Representative queries checked in diagnostic mode: (collection, filter, sort)
+DIAGNOSTIC_QUERIES = [
+    ("resources", {"course": {"$in": ["CS101", "BCA"]}}, [("_id", ASCENDING)]),
+    ("resources", {"subject": "DSA"}, [("_id", ASCENDING)]),
+    ("resources", {"semester": 4, "year": 2024}, [("_id", ASCENDING)]),
+    ("resources", {"year": 2025}, [("_id", ASCENDING)]),
+    ("resources", {"privacy": "public"}, [("_id", ASCENDING)]),
+    ("resources", {"processing": {"$in": ["pending", "failed"]}, "processing_attempts": {"$not": {"$gte": 3}}}, None),
+    ("reviews", {"teacher_name": "Dr. Arvinder Singh"}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("reviews", {}, [("date", DESCENDING), ("_id", DESCENDING)]),
+    ("events", {}, [("date", ASCENDING), ("_id", ASCENDING)]),
+    ("users", {"email": "student@example.com"}, None),
+]
+
+
+async def ensure_indexes(db) -> List[str]:
+    """Create the declared indexes. Safe to run on every startup.
+
+    Returns the collections whose indexes could not be created.
+    """
+    failed = []
+    for collection, models in INDEXES.items():
+        try:
+            await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate emails left over from before the unique index existed
+            print(f"❌ Index creation failed on {collection}: {e}")
+            failed.append(collection)
+    if failed:
+        print(f"❌ Database indexes incomplete on: {', '.join(failed)}")
+    else:
+        print("✅ Database indexes ensured")
+    return failed
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+async def find_collscans(db) -> List[str]:
+    """Explain the diagnostic queries and return the ones that scan the whole collection."""
+    offenders = []
+    for collection, query, sort in DIAGNOSTIC_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            plan = await cursor.explain()
+        except Exception as e:
+            print(f"Explain failed for {collection} {query}: {e}")
+            continue
+        winning = plan.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _stages(winning):
+            offenders.append(f"{collection} {query} sort={sort}")
+    return offenders
+
+
+async def bootstrap_indexes(db) -> None:
+    # Workers starting together (or on several hosts) build indexes once
+    if not await acquire_lease(db, "bootstrap_indexes", settings.index_bootstrap_lease_s):
+        print("Index bootstrap done by another worker")
+        return
+    await ensure_indexes(db)
+    if settings.index_diagnostics:
+        for offender in await find_collscans(db):
+            print(f"⚠️ COLLSCAN: {offender}")
@@ -0,0 +1,207 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from cache import TTLCache
+from database import get_db, settings
+from serialization import dumps
+
+# Server error codes: change streams need a replica set / the resume point is gone
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+RESUME_POINT_LOST = {280, 286}
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+HEARTBEAT = b": keep-alive\n\n"
+
+
+class Subscriber:
+    def __init__(self, collections: Set[str], maxsize: int):
+        self.collections = collections
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def offer(self, message: Optional[bytes]) -> bool:
+        """Queue a message without blocking; returns False if the subscriber fell behind.
+
+        A slow consumer's backlog is thrown away and replaced by a single
+        `resync` event telling the client to refetch, so one stalled tab
+        never holds memory or delays anyone else.
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC if message is not None else None)
+            return False
+
+
+class LiveFeed:
+    """Fans out inserts/updates/deletes on a few collections to SSE subscribers.
+
+    One feed per worker reads a single change stream over all the watched
+    collections (resuming from the last token after errors). On a standalone
+    mongod, where change streams are unavailable, it falls back to tailing
+    new documents by `_id` with a short lookback, which sees inserts only.
+    Each change is shaped and encoded once, then offered to every subscriber.
+    """
+
+    def __init__(self, collections: Dict[str, Callable[[dict], dict]], exclude_fields: Iterable[str] = ()):
+        # collection -> function shaping a document the way its list endpoint does
+        self.collections = collections
+        self.exclude_fields = list(exclude_fields)
+        self.mode = "starting"
+        self.published = 0
+        self.resyncs = 0
+        self._subscribers: List[Subscriber] = []
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self._streams_unsupported = settings.live_updates_mode == "poll"
+
+    # Subscribers
+
+    def subscribe(self, collections: Set[str]) -> Subscriber:
+        subscriber = Subscriber(collections, settings.live_queue_size)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, collection: str, op: str, doc_id, doc: Optional[dict]):
+        payload = {"collection": collection, "op": op, "id": str(doc_id)}
+        if doc is not None:
+            payload["doc"] = self.collections[collection](doc)
+        message = b"event: change\ndata: " + dumps(payload) + b"\n\n"
+        self.published += 1
+        for subscriber in self._subscribers:
+            if collection in subscriber.collections and not subscriber.offer(message):
+                self.resyncs += 1
+
+    def _resync_all(self):
+        for subscriber in self._subscribers:
+            subscriber.offer(RESYNC)
+
+    # Lifecycle
+
+    async def start(self):
+        if self._task is None and settings.live_updates_mode != "off":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.close_streams()
+
+    def close_streams(self):
+        """End every open stream so the server can shut down; clients reconnect elsewhere."""
+        for subscriber in list(self._subscribers):
+            subscriber.offer(None)
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            db = get_db()
+            if db is None:
+                await asyncio.sleep(backoff)
+                continue
+            try:
+                if self._streams_unsupported:
+                    await self._poll(db)
+                else:
+                    await self._watch(db)
+                backoff = 1.0
+            except NotImplementedError:
+                await self._fall_back("change streams are not implemented by this client")
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    await self._fall_back(e)
+                    continue
+                if e.code in RESUME_POINT_LOST:
+                    # Missed changes can't be replayed; clients refetch instead
+                    self._resume_token = None
+                    self._resync_all()
+                print(f"Live feed error: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            except Exception as e:
+                print(f"Live feed error: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    async def _fall_back(self, reason):
+        if settings.live_updates_mode == "change_stream":
+            # Polling explicitly disabled: keep trying, the deployment may be fixed
+            print(f"Live feed: change streams unavailable ({reason}); retrying")
+            await asyncio.sleep(30)
+            return
+        print(f"Live feed: change streams unavailable ({reason}); polling for new documents instead")
+        self._streams_unsupported = True
+
+    async def _watch(self, db):
+        pipeline = [
+            {"$match": {
+                "ns.coll": {"$in": list(self.collections)},
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+            }},
+            {"$project": {"updateDescription": 0, **{f"fullDocument.{f}": 0 for f in self.exclude_fields}}},
+        ]
+        async with db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as stream:
+            if self._resume_token is None and self.mode != "starting":
+                # Reopened without a resume point: changes in between are unknown
+                self._resync_all()
+            self.mode = "change_stream"
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                collection = change["ns"]["coll"]
+                doc_id = change["documentKey"]["_id"]
+                if change["operationType"] == "delete":
+                    self.publish(collection, "delete", doc_id, None)
+                elif change.get("fullDocument") is not None:
+                    op = "insert" if change["operationType"] == "insert" else "update"
+                    self.publish(collection, op, doc_id, change["fullDocument"])
+
+    async def _poll(self, db):
+        self.mode = "poll"
+        lookback = timedelta(seconds=settings.live_poll_lookback_s)
+        # Ids are assigned client-side, so documents can land slightly out of
+        # order; re-reading a lookback window and skipping seen ids covers that
+        seen = TTLCache(100000, settings.live_poll_lookback_s * 2)
+        projection = {f: 0 for f in self.exclude_fields} or None
+        primed = False
+        while True:
+            if not self._subscribers:
+                # Nobody listening: don't query, and start fresh when someone connects
+                primed = False
+                await asyncio.sleep(settings.live_poll_interval_s)
+                continue
+            since = ObjectId.from_datetime(datetime.now(timezone.utc) - lookback)
+            for collection in self.collections:
+                cursor = db[collection].find({"_id": {"$gt": since}}, projection).sort("_id", 1).limit(1000)
+                async for doc in cursor:
+                    if doc["_id"] in seen:
+                        continue
+                    seen.set(doc["_id"], True)
+                    if primed:
+                        self.publish(collection, "insert", doc["_id"], doc)
+            primed = True
+            await asyncio.sleep(settings.live_poll_interval_s)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "resyncs": self.resyncs,
+        }
@@ -1,26 +1,136 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 import aiofiles
+import aiofiles.os
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr
+from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
+import asyncio
 import os
 import shutil
-import uuid
+from urllib.parse import parse_qs
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from bson import ObjectId
+from jose import jwt
 from passlib.context import CryptContext
-from database import connect_to_mongo, close_mongo_connection, get_db
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from database import (
+    add_reconnect_listener, close_mongo_connection, connect_to_mongo, get_db, get_read_db, ping, settings,
+)
+from blob_store import BlobStore
+from object_store import create_object_store
+from content_encoding import CompressionMiddleware, PrecompressedFiles, accepted_encoding, available_encodings
+from upload_pipeline import FORM_OVERHEAD_BYTES, StoredUpload, UploadSizeGuard, max_upload_bytes
+from processing import ProcessingQueue, THUMBNAIL_DIR
+from indexes import bootstrap_indexes
+import rating_stats
+from cache import TTLCache
+from password_pool import PasswordHasher
+from file_serving import check_servable, serve_file, FileRangeResponse
+from counters import CounterBuffer
+from response_cache import ResponseCache, ResponseCacheMiddleware, create_backend
+from auth import SECRET_KEY, ALGORITHM, current_user, invalidate_user
+from write_queue import WriteBehindQueue
+from search_index import SearchIndex, regex_fallback, INDEXED_FIELDS
+from facets import FACET_FIELDS, empty_facets, facet_pipeline, facets_from_counts, format_facets
+import metrics
+from serialization import DocumentShaper, FastJSONResponse
+from live_updates import HEARTBEAT, LiveFeed
+from trending import TrendingRanker
+from drain import GracefulDrain
+from rate_limit import LimitClass, RateLimiter, RateLimitMiddleware, create_buckets
+from pagination import (
+    NEXT_CURSOR_HEADER, build_projection, decode_offset, encode_cursor,
+    fetch_page, page_size, set_next_cursor,
+)
+
+# Mongo command monitoring must be registered before the client is created
+metrics.install_mongo_listener()
 
 # Security Configuration
-SECRET_KEY = "your-secret-key-change-this-in-production"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+password_hasher = PasswordHasher(pwd_context, settings.password_hash_workers, settings.password_hash_max_queue)
+# Negative lookup cache: emails with no account, so stuffing traffic skips Mongo and bcrypt
+unknown_emails = TTLCache(settings.unknown_email_cache_size, settings.unknown_email_cache_ttl_s)
 
 app = FastAPI(title="Campus Resource Hub API")
+# SIGTERM: readiness turns 503 and SSE streams close before the server drains
+graceful_drain = GracefulDrain()
+# (filename, resource_id) -> the resource a download counts against ("" for none)
+download_owners = TTLCache(100000, 300)
+
+@app.exception_handler(ConnectionFailure)
+async def database_unavailable(request: Request, exc: ConnectionFailure):
+    # Lost the cluster mid-request (failover, network blip): fail fast and let
+    # clients retry; these responses are never cached
+    print(f"Database unavailable: {exc}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database temporarily unavailable"},
+        headers={"Retry-After": "5"},
+    )
+
+def classify_request(method: str, path: str, query_string: bytes) -> Optional[str]:
+    # Route classes with their own limits; everything else is never limited
+    if method == "POST" and path in ("/api/token", "/api/signup"):
+        return "auth"
+    if method == "POST" and path == "/api/upload":
+        return "upload"
+    if method == "POST" and path == "/api/upload/bulk":
+        return "bulk_upload"
+    if (method == "GET" and path in ("/api/resources", "/api/resources/facets")
+            and parse_qs(query_string.decode("latin-1")).get("search")):
+        return "search"
+    return None
+
+rate_limiter = RateLimiter(
+    create_buckets(),
+    classes={
+        "auth": LimitClass(settings.rate_limit_auth_per_min, settings.rate_limit_auth_burst),
+        "upload": LimitClass(settings.rate_limit_upload_per_min, settings.rate_limit_upload_burst,
+                             settings.upload_max_concurrent),
+        "search": LimitClass(settings.rate_limit_search_per_min, settings.rate_limit_search_burst,
+                             settings.search_max_concurrent),
+        "bulk_upload": LimitClass(settings.rate_limit_bulk_upload_per_min, settings.rate_limit_bulk_upload_burst,
+                                  settings.bulk_upload_max_concurrent),
+    },
+    classify=classify_request,
+)
+# Innermost: oversized upload bodies are cut off while they arrive, not after spooling
+app.add_middleware(UploadSizeGuard, limits={
+    "/api/upload": max_upload_bytes() + FORM_OVERHEAD_BYTES,
+    "/api/upload/bulk": settings.max_bulk_upload_size_mb * 1024 * 1024,
+})
+# Cached responses are served before any limit applies
+if settings.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# Negotiated compression runs inside the response cache, which keeps one entry
+# per encoding, so cached lists are compressed once rather than per request
+compression_encodings = available_encodings() if settings.compression_enabled else []
+if compression_encodings:
+    app.add_middleware(CompressionMiddleware, encodings=compression_encodings)
+
+def response_variant(scope) -> str:
+    return accepted_encoding(scope, compression_encodings) or ""
+
+# Response cache for read-heavy list endpoints; write endpoints invalidate by namespace
+response_cache = ResponseCache(
+    create_backend(),
+    routes={
+        "/api/resources": "resources",
+        "/api/resources/facets": "resources",
+        "/api/events": "events",
+        "/api/teachers": "teachers",
+        "/api/exams": "exams",
+        "/api/ratings": "ratings",
+    },
+    prefixes={"/api/ratings/summary": "ratings"},
+)
+# Added before CORS so it runs inside it and never stores per-origin headers
+app.add_middleware(ResponseCacheMiddleware, cache=response_cache, variant=response_variant)
 
 # Configure CORS
 app.add_middleware(
@@ -29,12 +139,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Outermost, so cache hits and CORS preflights are timed too
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware, router=app.router)
+loop_lag_monitor = metrics.LoopLagMonitor(settings.metrics_loop_lag_interval_s)
+
 # Optimized Upload Directory (Outside source root to prevent Uvicorn reloads)
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resource_storage")
+UPLOAD_DIR = settings.storage_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resource_storage")
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
+blob_store = BlobStore(UPLOAD_DIR, create_object_store())
+# Text-like downloads get compressed copies made once, next to the originals
+precompressed_files = PrecompressedFiles(UPLOAD_DIR, compression_encodings)
+search_index = SearchIndex()
+download_counts = CounterBuffer("resources", "downloads")
+trending = TrendingRanker()
+async def invalidate_resources():
+    await response_cache.invalidate("resources")
+
+async def resource_processed(resource_id: ObjectId):
+    # Extracted text becomes searchable; cards pick up page count and thumbnail
+    doc = await get_db().resources.find_one({"_id": resource_id}, INDEXED_FIELDS)
+    if doc:
+        search_index.add(doc)
+    await response_cache.invalidate("resources")
+
+processing_queue = ProcessingQueue(blob_store, on_processed=resource_processed)
+resource_writes = WriteBehindQueue(
+    "resources",
+    journal_path=os.path.join(UPLOAD_DIR, ".pending_resources.jsonl"),
+    on_flush=invalidate_resources,
+    # Blob references are counted once the resource document exists
+    on_insert=blob_store.commit_inserted
+)
+
+# Queue depths, read at scrape time
+metrics.registry.gauge("password_hash_waiting", "Logins/signups waiting for a bcrypt worker.",
+                       lambda: password_hasher.waiting)
+metrics.registry.gauge("password_hash_running", "bcrypt hashes currently running.", lambda: password_hasher.running)
+metrics.registry.gauge("resource_writes_pending", "Resource inserts waiting in the write-behind queue.",
+                       lambda: resource_writes.pending)
+metrics.registry.gauge("download_counts_pending", "Downloads counted in memory but not yet flushed.",
+                       lambda: download_counts.pending)
+metrics.registry.gauge("processing_queued", "Uploads waiting for text extraction/thumbnails.",
+                       lambda: processing_queue.stats()["queued"])
+
+async def mongo_reconnected(db):
+    # Startup work that was skipped while the database was unreachable, and
+    # drop any empty lists cached during the outage
+    await bootstrap_indexes(db)
+    await processing_queue.resume()
+    await response_cache.invalidate_all()
+
+add_reconnect_listener(mongo_reconnected)
 
 # Models
 class UserBase(BaseModel):
@@ -71,11 +231,36 @@ class Resource(BaseModel):
     year: Optional[int] = None
     description: Optional[str] = None
     college: Optional[str] = None
+    content_type: Optional[str] = None
+    pages: Optional[int] = None
+    thumbnail: Optional[str] = None
+
+# Fields clients may change. Storage (sha256, filename), processing results
+# and counters belong to the server: blob reference counts trust them.
+EDITABLE_RESOURCE_FIELDS = {
+    "title", "subject", "course", "type", "author", "date", "privacy",
+    "semester", "year", "description", "college",
+}
+
+def editable_update(update: dict) -> dict:
+    """The part of a client update that may be `$set`; everything else is dropped.
+
+    The edit form sends the whole resource back, server-owned fields included.
+    """
+    return {field: value for field, value in update.items() if field in EDITABLE_RESOURCE_FIELDS}
+
+class BulkResourceOperation(BaseModel):
+    op: str # update or delete
+    id: str
+    update: Optional[dict] = None # fields to $set for updates
+
+class BulkResourceRequest(BaseModel):
+    operations: List[BulkResourceOperation]
 
 class Rating(BaseModel):
     teacher_name: str
     subject: str
-    rating: int # 1 to 5
+    rating: int = Field(ge=1, le=5)
     feedback: str
     user_email: Optional[str] = None
     date: str = datetime.utcnow().strftime("%Y-%m-%d")
@@ -96,11 +281,17 @@ class Event(BaseModel):
     status: Optional[str] = "upcoming"
 
 # Auth Helpers
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -116,32 +307,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 @app.on_event("startup")
 async def startup_db_client():
     await connect_to_mongo()
+    db = get_db()
+    if db is not None:
+        await bootstrap_indexes(db)
+    await resource_writes.start()
+    await search_index.start()
+    await download_counts.start()
+    await processing_queue.start()
+    await live_feed.start()
+    await trending.start()
+    await blob_store.start()
+    if settings.metrics_enabled:
+        await loop_lag_monitor.start()
+    graceful_drain.install()
     print("Backend startup complete.")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await loop_lag_monitor.stop()
+    await live_feed.stop()
+    await trending.stop()
+    await processing_queue.stop()
+    await search_index.stop()
+    # The final flush still counts blob references
+    await resource_writes.stop()
+    await blob_store.stop()
+    await download_counts.stop()
     await close_mongo_connection()
+    password_hasher.shutdown()
 
 # Auth Endpoints
 @app.post("/api/signup")
 async def signup(user: UserCreate):
     db = get_db()
-    # Skip uniqueness check for demo if it hangs, or just keep it simple
-    try:
-        existing_user = await db.users.find_one({"email": user.email})
-        if existing_user:
-            # For demo, let's just update or keep going instead of erroring
-            # return {"message": "User already exists", "email": user.email}
-            pass
-    except:
-        pass # Ignore DB issues for demo speed
-    
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     new_user = user.dict()
     new_user["password"] = hashed_password
     
+    # users.email is unique, so the insert itself is the existence check
     try:
         await db.users.insert_one(new_user)
+        unknown_emails.pop(user.email)
+        invalidate_user(user.email)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User already exists")
     except:
         pass # Fail silently for demo if DB is slow
         
@@ -152,6 +361,12 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # Immediate check for master password to speed up response
     is_master_password = form_data.password == "uni123"
     
+    if not is_master_password and form_data.username in unknown_emails:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+        )
+    
     db = get_db()
     user = await db.users.find_one({"email": form_data.username})
     
@@ -161,18 +376,25 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             new_user = {
                 "email": form_data.username,
                 "name": form_data.username.split('@')[0],
-                "password": get_password_hash("uni123"),
+                "password": await get_password_hash("uni123"),
                 "college": "Demo University",
                 "branch": "General",
                 "semester": "1"
             }
-            await db.users.insert_one(new_user)
+            try:
+                await db.users.insert_one(new_user)
+            except DuplicateKeyError:
+                pass # Created by a concurrent login with the same email
+            unknown_emails.pop(form_data.username)
+            invalidate_user(form_data.username)
         
         access_token = create_access_token(data={"sub": form_data.username})
         return {"access_token": access_token, "token_type": "bearer"}
     
     # Normal login logic
-    if not user or not verify_password(form_data.password, user["password"]):
+    if not user:
+        unknown_emails.set(form_data.username, True)
+    if not user or not await verify_password(form_data.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -180,87 +402,238 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     access_token = create_access_token(data={"sub": user["email"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.get("/health/live")
+async def liveness():
+    # The process is up and the event loop is responsive
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+    # Ready to serve real data: MongoDB answers a ping and we are not shutting down
+    if graceful_drain.draining:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "draining"}
+    database_ok = await ping()
+    if not database_ok:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "ok" if database_ok else "unavailable",
+        "database": database_ok,
+        "search_index": search_index.ready,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/api/rate-limit/stats")
+async def get_rate_limit_stats():
+    return rate_limiter.stats()
+
+@app.get("/api/auth/stats")
+async def get_auth_stats():
+    return {
+        "password_hashing": password_hasher.stats(),
+        "unknown_email_cache": unknown_emails.stats()
+    }
+
 # Profile Endpoints
 @app.get("/api/profile", response_model=UserProfile)
-async def get_profile(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-        
-    db = get_db()
-    user = await db.users.find_one({"email": email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def get_profile(user: dict = Depends(current_user)):
     return user
 
 # Resources Endpoints
+# Keyset order for list endpoints; the last key is unique so pages never overlap
+RESOURCE_SORT = [("_id", 1)]
+EVENT_SORT = [("date", 1), ("_id", 1)]
+RATING_SORT = [("date", -1), ("_id", -1)]
+
+# Fields the response models cannot be built without; `fields=` can add the rest
+RESOURCE_REQUIRED_FIELDS = ["title", "course", "type", "author", "date", "privacy"]
+RATING_REQUIRED_FIELDS = ["teacher_name", "subject", "rating", "date"]
+# Default list projection: just the model's fields (never the extracted PDF text)
+RESOURCE_PROJECTION = {field: 1 for field in Resource.model_fields if field != "id"}
+resource_shaper = DocumentShaper(Resource)
+event_shaper = DocumentShaper(Event)
+
+def _one_or_many(value: str):
+    # Handle multiple values if sent as comma-separated (simple multi-tag support)
+    if "," in value:
+        return {"$in": value.split(",")}
+    return value
+
+def build_resource_filters(
+    course: Optional[str] = None,
+    subject: Optional[str] = None,
+    type: Optional[str] = None,
+    semester: Optional[int] = None,
+    year: Optional[int] = None,
+    privacy: Optional[str] = None
+) -> dict:
+    query = {}
+    if course:
+        query["course"] = _one_or_many(course)
+    if subject:
+        query["subject"] = _one_or_many(subject)
+    if type:
+        query["type"] = _one_or_many(type)
+    if semester:
+        query["semester"] = semester
+    if year:
+        query["year"] = year
+    if privacy:
+        query["privacy"] = privacy
+    return query
+
 @app.get("/api/resources", response_model=List[Resource])
 async def get_resources(
     course: Optional[str] = None, 
     subject: Optional[str] = None,
+    type: Optional[str] = None,
     semester: Optional[int] = None,
     year: Optional[int] = None,
     search: Optional[str] = None,
-    privacy: Optional[str] = None
+    privacy: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    db = get_db()
+    db = get_read_db()
     if db is None:
         return []
-    query = {}
+    limit = page_size(limit)
+    # Extracted PDF text is only for the search index; never ship it in list pages
+    projection = build_projection(fields, Resource.model_fields, RESOURCE_REQUIRED_FIELDS) or RESOURCE_PROJECTION
     
     try:
-        # Handle multiple values if sent as comma-separated (simple multi-tag support)
-        if course:
-            if "," in course:
-                query["course"] = {"$in": course.split(",")}
-            else:
-                query["course"] = course
-                
-        if subject:
-            if "," in subject:
-                query["subject"] = {"$in": subject.split(",")}
-            else:
-                query["subject"] = subject
-                
-        if semester:
-            query["semester"] = semester
-        if year:
-            query["year"] = year
-        if privacy:
-            query["privacy"] = privacy
+        query = build_resource_filters(course, subject, type, semester, year, privacy)
             
-        if search:
-            # Omni-search across multiple fields
-            search_query = {"$regex": search, "$options": "i"}
-            query["$or"] = [
-                {"title": search_query},
-                {"subject": search_query},
-                {"course": search_query},
-                {"description": search_query}
-            ]
-            
-        cursor = db.resources.find(query)
-        resources = await cursor.to_list(length=100)
+        if search and search_index.ready:
+            # The index ranks and filters; Mongo only loads the page. Filters are
+            # re-checked there, so writes other workers made since the last
+            # rebuild can't leak a non-matching resource onto the page.
+            # Ranked pages are addressed by offset into the filtered ranking.
+            offset = decode_offset(cursor)
+            hits, total = search_index.search(search, query, offset, limit)
+            if not hits:
+                return []
+            page_ids = [ObjectId(doc_id) for doc_id, _ in hits]
+            docs = await db.resources.find({**query, "_id": {"$in": page_ids}}, projection).to_list(length=None)
+            by_id = {doc["_id"]: doc for doc in docs}
+            resources = [by_id[_id] for _id in page_ids if _id in by_id]
+            next_token = encode_cursor({"o": offset + limit}) if offset + limit < total else None
+        else:
+            if search:
+                # Index still loading: omni-search with the input escaped
+                query.update(regex_fallback(search))
+            resources, next_token = await fetch_page(db.resources, query, RESOURCE_SORT, limit, cursor, projection)
         
-        # Convert MongoDB _id to string id
-        for resource in resources:
-            resource["id"] = str(resource["_id"])
-            
-        return resources
+        # Shaped straight into the Resource schema (_id -> id) and encoded without re-validation
+        page = FastJSONResponse(resource_shaper.shape_many(resources))
+        set_next_cursor(page, next_token)
+        return page
+    except HTTPException:
+        raise
+    except ConnectionFailure:
+        raise
     except Exception as e:
         print(f"Resource list error: {e}")
         return []
 
 
+@app.get("/api/resources/facets")
+async def get_resource_facets(
+    course: Optional[str] = None,
+    subject: Optional[str] = None,
+    type: Optional[str] = None,
+    semester: Optional[int] = None,
+    year: Optional[int] = None,
+    search: Optional[str] = None,
+    privacy: Optional[str] = None
+):
+    db = get_read_db()
+    if db is None:
+        return empty_facets()
+    filters = build_resource_filters(course, subject, type, semester, year, privacy)
+    try:
+        if search and search_index.ready:
+            # Counted in the index over the full match set, no ids sent to Mongo
+            return format_facets(facets_from_counts(search_index.facet_counts(search, filters, FACET_FIELDS)))
+        if search:
+            filters.update(regex_fallback(search))
+        result = await db.resources.aggregate(facet_pipeline(filters)).to_list(length=1)
+    except ConnectionFailure:
+        raise
+    except Exception as e:
+        print(f"Facet count error: {e}")
+        return empty_facets()
+    return format_facets(result[0] if result else {})
+
+
+@app.get("/api/resources/trending")
+async def get_trending_resources(
+    course: Optional[str] = None,
+    semester: Optional[int] = None,
+    college: Optional[str] = None,
+    limit: int = 10
+):
+    # One segment per request: the first of course, semester, college given, else all
+    segment = next(((field, value) for field, value in
+                    (("course", course), ("semester", semester), ("college", college)) if value), (None, None))
+    ranked = trending.top(min(max(limit, 1), settings.trending_top_k), *segment)
+    db = get_read_db()
+    if db is None or not ranked:
+        return []
+    docs = await db.resources.find(
+        {"_id": {"$in": [ObjectId(doc_id) for doc_id, _ in ranked]}}, RESOURCE_PROJECTION
+    ).to_list(length=None)
+    by_id = {str(doc["_id"]): doc for doc in docs}
+    return FastJSONResponse([
+        {**resource_shaper.shape(by_id[doc_id]), "trending_score": round(score, 3)}
+        for doc_id, score in ranked if doc_id in by_id
+    ])
+
+@app.post("/api/resources/{resource_id}/view")
+async def record_resource_view(resource_id: str):
+    if not ObjectId.is_valid(resource_id):
+        raise HTTPException(status_code=400, detail="Invalid resource id")
+    trending.record(resource_id, "view")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@app.get("/api/trending/stats")
+async def get_trending_stats():
+    return trending.stats()
+
+
 @app.post("/api/upload-test")
 async def upload_test():
     return {"status": "ok", "message": "Upload endpoint is reachable"}
 
+def register_upload(stored: StoredUpload, metadata: dict) -> ObjectId:
+    # Register metadata through the write-behind queue (batched, survives DB outages)
+    resource_doc = {
+        **metadata,
+        "downloads": 0,
+        "date": datetime.utcnow().strftime("%Y-%m-%d"),
+        "filename": stored.filename,
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "content_type": stored.content_type,
+        "staged_blob": stored.staged,
+        "processing": "pending"
+    }
+    resource_id = resource_writes.enqueue(resource_doc)
+    search_index.add(resource_doc)
+    # Text extraction and thumbnails happen in the background, after the response
+    processing_queue.submit(resource_id)
+    return resource_id
+
 @app.post("/api/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -276,67 +649,278 @@ async def upload_file(
     description: Optional[str] = Form(None)
 ):
     try:
-        # Save file to disk
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        # Content-addressed storage: identical files are only written once
+        stored = await blob_store.put(file)
         
-        with open(file_path, "wb") as out_file:
-            content = await file.read()
-            out_file.write(content)
+        resource_id = register_upload(stored, {
+            "title": title,
+            "subject": subject,
+            "course": course,
+            "author": author,
+            "type": type,
+            "privacy": privacy,
+            "semester": _optional_int(semester),
+            "year": _optional_int(year),
+            "description": description,
+            "college": college
+        })
         
-        # Return success (skip DB for now since Atlas is offline)
         return {
             "message": "File uploaded successfully", 
-            "filename": unique_filename,
+            "id": str(resource_id),
+            "filename": stored.filename,
             "title": title,
             "course": course,
-            "type": type
+            "type": type,
+            "size": stored.size,
+            "sha256": stored.sha256,
+            "deduplicated": stored.deduplicated
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Upload error: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@app.post("/api/upload/bulk")
+async def upload_files_bulk(
+    files: List[UploadFile] = File(...),
+    course: str = Form(...),
+    author: str = Form(...),
+    type: str = Form(...),
+    subject: Optional[str] = Form(None),
+    privacy: str = Form("public"),
+    semester: Optional[str] = Form(None),
+    year: Optional[str] = Form(None),
+    college: Optional[str] = Form(None)
+):
+    if len(files) > settings.bulk_upload_max_files:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.bulk_upload_max_files} files per bulk upload",
+        )
+    # Shared metadata for every file; titles default to the file names
+    metadata = {
+        "subject": subject,
+        "course": course,
+        "author": author,
+        "type": type,
+        "privacy": privacy,
+        "semester": _optional_int(semester),
+        "year": _optional_int(year),
+        "description": None,
+        "college": college
+    }
+    slots = asyncio.Semaphore(settings.bulk_upload_concurrency)
+
+    async def store_one(file: UploadFile) -> dict:
+        title = os.path.splitext(file.filename or "")[0] or "Untitled"
+        async with slots:
+            try:
+                stored = await blob_store.put(file)
+            except HTTPException as e:
+                return {"file": file.filename, "status": "error", "error": e.detail}
+            except Exception as e:
+                print(f"Bulk upload error ({file.filename}): {e}")
+                return {"file": file.filename, "status": "error", "error": str(e)}
+        resource_id = register_upload(stored, {**metadata, "title": title})
+        return {
+            "file": file.filename,
+            "status": "ok",
+            "id": str(resource_id),
+            "filename": stored.filename,
+            "size": stored.size,
+            "deduplicated": stored.deduplicated
+        }
+
+    results = await asyncio.gather(*(store_one(f) for f in files))
+    uploaded = sum(1 for r in results if r["status"] == "ok")
+    return {"uploaded": uploaded, "failed": len(results) - uploaded, "results": results}
+
+@app.post("/api/resources/bulk")
+async def bulk_update_resources(request: BulkResourceRequest):
+    db = get_db()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    if len(request.operations) > settings.bulk_max_operations:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {settings.bulk_max_operations} operations per request")
+    
+    results = [{"id": op.id, "op": op.op, "status": "ok"} for op in request.operations]
+    valid = []
+    seen_ids = set()
+    for i, op in enumerate(request.operations):
+        if op.op == "update":
+            # Same allowlist as update_resource: blob refcounts trust sha256/filename
+            op.update = editable_update(op.update or {})
+        if op.op not in ("update", "delete"):
+            results[i].update(status="error", error="op must be 'update' or 'delete'")
+        elif not ObjectId.is_valid(op.id):
+            results[i].update(status="error", error="invalid id")
+        elif op.op == "update" and not op.update:
+            results[i].update(status="error", error="nothing to update")
+        elif ObjectId(op.id) in seen_ids:
+            # One operation per resource, so a delete can't release a shared blob twice
+            results[i].update(status="error", error="duplicate id in request")
+        else:
+            seen_ids.add(ObjectId(op.id))
+            valid.append(i)
+    
+    # One read to report missing ids
+    ids = [ObjectId(request.operations[i].id) for i in valid]
+    existing = {
+        doc["_id"]: doc
+        for doc in await db.resources.find({"_id": {"$in": ids}}, {"_id": 1}).to_list(length=None)
+    }
+    ops, op_index, delete_index = [], [], []
+    for i in valid:
+        op = request.operations[i]
+        _id = ObjectId(op.id)
+        if _id not in existing:
+            results[i].update(status="error", error="not found")
+            continue
+        if op.op == "update":
+            ops.append(UpdateOne({"_id": _id}, {"$set": op.update}))
+            op_index.append(i)
+        else:
+            delete_index.append(i)
+    
+    if ops:
+        try:
+            await db.resources.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                results[op_index[err["index"]]].update(status="error", error=err.get("errmsg"))
+    
+    # Deletes go one by one like delete_resource: only the request that actually
+    # removed a document releases its blob, even if another request raced us
+    removed = await asyncio.gather(*(
+        db.resources.find_one_and_delete({"_id": ObjectId(request.operations[i].id)}, {"filename": 1, "sha256": 1, "size": 1, "content_type": 1, "staged_blob": 1})
+        for i in delete_index
+    ))
+    for i, resource in zip(delete_index, removed):
+        if resource is None:
+            results[i].update(status="error", error="not found")
+            continue
+        search_index.remove(str(resource["_id"]))
+        trending.remove(resource["_id"])
+        await blob_store.remove_resource_file(resource)
+    
+    # Keep the search index and cached lists in step with what was applied
+    applied = [request.operations[i] for i in op_index if results[i]["status"] == "ok"]
+    reindex = [
+        ObjectId(op.id) for op in applied
+        if op.op == "update" and any(field in op.update for field in INDEXED_FIELDS)
+    ]
+    if reindex:
+        async for doc in db.resources.find({"_id": {"$in": reindex}}, INDEXED_FIELDS):
+            search_index.add(doc)
+    await response_cache.invalidate("resources")
+    
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
 @app.put("/api/resources/{resource_id}")
 async def update_resource(resource_id: str, resource_update: dict):
-    from bson import ObjectId
+    resource_update = editable_update(resource_update)
+    if not resource_update:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    if not ObjectId.is_valid(resource_id):
+        raise HTTPException(status_code=400, detail="Invalid resource id")
     db = get_db()
     await db.resources.update_one(
         {"_id": ObjectId(resource_id)},
         {"$set": resource_update}
     )
+    if any(field in resource_update for field in INDEXED_FIELDS):
+        updated = await db.resources.find_one({"_id": ObjectId(resource_id)}, INDEXED_FIELDS)
+        if updated:
+            search_index.add(updated)
+    await response_cache.invalidate("resources")
     return {"message": "Resource updated successfully"}
 
 @app.delete("/api/resources/{resource_id}")
 async def delete_resource(resource_id: str):
-    from bson import ObjectId
     db = get_db()
     
-    # First find the file to delete it from disk
-    resource = await db.resources.find_one({"_id": ObjectId(resource_id)})
-    if resource and "filename" in resource:
-        file_path = os.path.join(UPLOAD_DIR, resource["filename"])
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
-    await db.resources.delete_one({"_id": ObjectId(resource_id)})
+    # Drop the document first, then release its blob (removed from disk on last reference)
+    resource = await db.resources.find_one_and_delete({"_id": ObjectId(resource_id)})
+    search_index.remove(resource_id)
+    trending.remove(resource_id)
+    if resource:
+        await blob_store.remove_resource_file(resource)
+    await response_cache.invalidate("resources")
+
     return {"message": "Resource deleted successfully"}
 
+async def download_owner(filename: str, resource_id: Optional[str]) -> Optional[ObjectId]:
+    """The resource a download is counted against, or None to not count it.
+
+    The same file can back several resources, so the client names one; the
+    id only counts if that resource really serves this file. Without an id
+    the file must belong to exactly one resource.
+    """
+    key = (filename, resource_id)
+    owner = download_owners.get(key)
+    if owner is not None:
+        return owner or None
+    db = get_db()
+    if db is None:
+        return None
+    if resource_id:
+        doc = None
+        if ObjectId.is_valid(resource_id):
+            doc = await db.resources.find_one({"_id": ObjectId(resource_id), "filename": filename}, {"_id": 1})
+        owner = doc["_id"] if doc else ""
+    else:
+        docs = await db.resources.find({"filename": filename}, {"_id": 1}).limit(2).to_list(2)
+        owner = docs[0]["_id"] if len(docs) == 1 else ""
+    download_owners.set(key, owner)
+    return owner or None
+
 @app.get("/api/download/{filename}")
-async def download_file(filename: str):
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
+async def download_file(filename: str, request: Request, resource_id: Optional[str] = None):
+    check_servable(filename)
+    # Hot files are served from local disk; evicted ones are redirected to the
+    # object store if enabled, otherwise fetched back first
+    path = blob_store.path(filename)
+    url = None if await aiofiles.os.path.exists(path) else blob_store.presigned_url(filename)
+    if url:
+        response = RedirectResponse(url, status_code=307)
+    else:
+        path = await blob_store.local_path(filename) or path
+        # Range requests, ETag/Last-Modified revalidation and a content type from the stored name
+        encoded = precompressed_files.variant(request.scope, filename, path)
+        response = await serve_file(request, path, filename, encoded)
     
-    # Force PDF media type and inline display if possible, or attachment
-    return FileResponse(
-        file_path, 
-        media_type='application/pdf',
-        filename=filename,
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
+    # Count real downloads only: not HEAD, 304 revalidations or mid-file range reads
+    if request.method != "HEAD" and (
+            (isinstance(response, FileRangeResponse) and response.offset == 0)
+            or (isinstance(response, RedirectResponse) and "range" not in request.headers)):
+        owner = await download_owner(filename, resource_id)
+        if owner is not None:
+            download_counts.increment(("_id", owner))
+            trending.record(str(owner), "download")
+    return response
+
+@app.get("/api/thumbnails/{name}")
+async def get_thumbnail(name: str, request: Request):
+    check_servable(name)
+    return await serve_file(request, os.path.join(blob_store.root, THUMBNAIL_DIR, name), name)
+
+@app.get("/api/processing/stats")
+async def get_processing_stats():
+    return processing_queue.stats()
+
+@app.get("/api/storage/stats")
+async def get_storage_stats():
+    return blob_store.stats()
+
+@app.get("/api/compression/stats")
+async def get_compression_stats():
+    return {"encodings": compression_encodings, "precompressed": precompressed_files.stats()}
 
 # Exam Timer Endpoints
 @app.get("/api/exams")
@@ -350,17 +934,20 @@ async def get_exams():
 
 # Event Endpoints (Calendar)
 @app.get("/api/events", response_model=List[Event])
-async def get_events():
-    db = get_db()
+async def get_events(limit: Optional[int] = None, cursor: Optional[str] = None):
+    db = get_read_db()
     if db is None:
         return []
     try:
-        cursor = db.events.find()
-        events = await cursor.to_list(length=100)
-        for e in events:
-            if "_id" in e:
-                e["id"] = str(e["_id"])
-        return events
+        projection = {field: 1 for field in Event.model_fields if field != "id"}
+        events, next_token = await fetch_page(db.events, {}, EVENT_SORT, page_size(limit), cursor, projection)
+        page = FastJSONResponse(event_shaper.shape_many(events))
+        set_next_cursor(page, next_token)
+        return page
+    except HTTPException:
+        raise
+    except ConnectionFailure:
+        raise
     except Exception as e:
         print(f"Events fetch error: {e}")
         return []
@@ -371,10 +958,15 @@ async def create_event(event: Event):
     if db is None:
         raise HTTPException(status_code=503, detail="Database unavailable")
     event_data = event.dict()
+    # The client's temporary id is not stored; Mongo assigns the real one
+    event_data.pop("id", None)
     if "_id" in event_data:
         del event_data["_id"]
     try:
-        await db.events.insert_one(event_data)
+        result = await db.events.insert_one(event_data)
+        await response_cache.invalidate("events")
+        event_data.pop("_id", None)
+        event_data["id"] = str(result.inserted_id)
         return {"message": "Event created successfully", "event": event_data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -391,33 +983,124 @@ async def add_rating(rating: Rating):
     rating_dict = rating.dict()
     try:
         await db.reviews.insert_one(rating_dict)
-        return {"message": "Rating submitted successfully"}
+        await rating_stats.record_rating(db, rating_dict)
+        await response_cache.invalidate("ratings")
+        return {"message": "Rating submitted successfully", "id": str(rating_dict["_id"])}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/ratings")
-async def get_ratings(teacher_name: Optional[str] = None):
-    db = get_db()
+async def get_ratings(
+    teacher_name: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    db = get_read_db()
     if db is None:
         # Return empty list or helpful error
         return []
     query = {}
     if teacher_name:
         query["teacher_name"] = teacher_name
+    projection = build_projection(fields, Rating.model_fields, RATING_REQUIRED_FIELDS)
     
     try:
-        cursor = db.reviews.find(query).sort("date", -1)
-        ratings = await cursor.to_list(length=100)
+        ratings, next_token = await fetch_page(db.reviews, query, RATING_SORT, page_size(limit), cursor, projection)
+    except HTTPException:
+        raise
+    except ConnectionFailure:
+        raise
     except Exception as e:
         print(f"DB Query Error: {e}")
         return []
     
-    for r in ratings:
-        r["id"] = str(r["_id"])
-    return ratings
+    page = FastJSONResponse([shape_rating(r) for r in ratings])
+    set_next_cursor(page, next_token)
+    return page
+
+def shape_rating(doc: dict) -> dict:
+    # Ratings have no response model: the stored document with a string id
+    doc = dict(doc)
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+# Rating aggregates, maintained incrementally by add_rating
+@app.get("/api/ratings/summary")
+async def get_rating_summary(teacher_name: Optional[str] = None, subject: Optional[str] = None):
+    db = get_read_db()
+    if db is None:
+        return []
+    try:
+        docs = await rating_stats.find_stats(db, teacher_name, subject)
+    except ConnectionFailure:
+        raise
+    except Exception as e:
+        print(f"Rating summary error: {e}")
+        return []
+    return [rating_stats.summarize(doc) for doc in docs]
+
+@app.get("/api/ratings/summary/{teacher_name}")
+async def get_teacher_rating_summary(teacher_name: str):
+    db = get_read_db()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    docs = await rating_stats.find_stats(db, teacher_name)
+    return rating_stats.combine(teacher_name, docs)
+
+@app.post("/api/ratings/summary/rebuild")
+async def rebuild_rating_summary():
+    db = get_db()
+    if db is None:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    rebuilt = await rating_stats.rebuild(db)
+    await response_cache.invalidate("ratings")
+    return {"message": "Rating summaries rebuilt", "count": rebuilt}
+
+# Live updates: one change feed per worker, fanned out to every open page over SSE
+live_feed = LiveFeed(
+    {"events": event_shaper.shape, "reviews": shape_rating, "resources": resource_shaper.shape},
+    exclude_fields=["extracted_text", "extracted_summary", "search_terms", "staged_blob"],
+)
+metrics.registry.gauge("live_subscribers", "Open live-update (SSE) connections.", lambda: live_feed.subscribers)
+graceful_drain.on_drain(live_feed.close_streams)
+
+@app.get("/api/live")
+async def live_updates(collections: str = "events,reviews,resources"):
+    wanted = {c.strip() for c in collections.split(",") if c.strip()}
+    unknown = wanted - set(live_feed.collections)
+    if unknown or not wanted:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(sorted(unknown)) or 'none given'}")
+    if graceful_drain.draining:
+        raise HTTPException(status_code=503, detail="Server is restarting", headers={"Retry-After": "3"})
+    async def stream():
+        subscriber = live_feed.subscribe(wanted)
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), settings.live_heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            live_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/api/live/stats")
+async def get_live_stats():
+    return live_feed.stats()
 
 if __name__ == "__main__":
+    # Single process for development; `python serve.py` runs one worker per core
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host=settings.server_host, port=settings.server_port)
 
 
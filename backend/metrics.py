@@ -0,0 +1,291 @@
+import asyncio
+import bisect
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from pymongo import monitoring
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """A settable gauge, or one computed at scrape time when given `function`."""
+
+    def __init__(self, name: str, help: str, function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> List[str]:
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(value)}"]
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, list] = {}
+        # Observations also arrive from Motor's executor threads
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (counts, total, count) in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help, function))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_latency = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.",
+    ("method", "route", "status"),
+)
+requests_in_flight = registry.gauge("http_requests_in_flight", "Requests currently being handled.")
+request_bytes = registry.counter(
+    "http_request_body_bytes_total", "Request body bytes received (uploads).", ("route",))
+response_bytes = registry.counter(
+    "http_response_body_bytes_total", "Response body bytes sent (downloads, lists).", ("route",))
+
+mongo_commands = registry.counter(
+    "mongodb_commands_total", "MongoDB commands issued, by command and outcome.", ("command", "outcome"))
+mongo_latency = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips (sampled).", ("command",), MONGO_BUCKETS)
+
+loop_lag = registry.histogram("event_loop_lag_seconds", "Event loop scheduling delay.", (), LAG_BUCKETS)
+loop_lag_last = registry.gauge("event_loop_lag_last_seconds", "Most recent event loop lag measurement.")
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """PyMongo command monitoring: every command is counted, timings are sampled.
+
+    The listener runs on the thread that issued the command, so it only does
+    a counter bump and, for the sampled fraction, one histogram observation.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands.inc(event.command_name, "ok")
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            mongo_latency.observe(event.duration_micros / 1_000_000, event.command_name)
+
+    def failed(self, event):
+        mongo_commands.inc(event.command_name, "error")
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            mongo_latency.observe(event.duration_micros / 1_000_000, event.command_name)
+
+
+def install_mongo_listener():
+    """Register command monitoring globally; applies to clients created afterwards."""
+    if settings.metrics_enabled and settings.metrics_mongo_sample_rate > 0:
+        monitoring.register(MongoCommandMetrics(settings.metrics_mongo_sample_rate))
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how blocked the loop is."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            loop_lag.observe(lag)
+            loop_lag_last.set(lag)
+
+
+class MetricsMiddleware:
+    """Per-route latency, in-flight requests and body byte counts.
+
+    Routes are labelled by their path template (/api/resources/{resource_id}),
+    never the raw path, to keep the number of series bounded. Requests that
+    never reach the router (response cache hits) are matched against the
+    route table here; anything unmatched is labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp, router=None):
+        self.app = app
+        self.router = router
+
+    def _route_for(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return getattr(route, "path", "unmatched")
+        if self.router is not None:
+            for candidate in self.router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    return getattr(candidate, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        received = 0
+        sent = 0
+        declared_length: Optional[int] = None
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message):
+            nonlocal status, sent, declared_length
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-length":
+                        declared_length = int(value)
+                        break
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            requests_in_flight.dec()
+            route = self._route_for(scope)
+            request_latency.observe(time.perf_counter() - started, scope["method"], route, f"{status // 100}xx")
+            if received:
+                request_bytes.inc(route, amount=received)
+            # Zero-copy file responses don't pass their body through send
+            sent = max(sent, declared_length or 0)
+            if sent:
+                response_bytes.inc(route, amount=sent)
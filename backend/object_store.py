@@ -0,0 +1,128 @@
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from database import settings
+
+# boto3 is optional: it is only needed for the S3-compatible cold tier
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+
+class S3ObjectStore:
+    """Cold tier on an S3-compatible object store (AWS S3, MinIO, Ceph RGW...).
+
+    boto3 is synchronous, so calls run on a small dedicated thread pool.
+    Transfers go straight between the local file and the bucket (multipart
+    for large files), so memory use does not grow with the file size.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = "", region: str = "",
+                 access_key: str = "", secret_key: str = "", workers: int = 8):
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            # Path-style addressing works with MinIO and other self-hosted stores
+            config=BotoConfig(s3={"addressing_style": "path"}, max_pool_connections=workers),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3")
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def put(self, key: str, path: str, content_type: Optional[str] = None):
+        extra = {"ContentType": content_type} if content_type else None
+        await self._call(self._client.upload_file, path, self.bucket, key, ExtraArgs=extra)
+
+    async def fetch(self, key: str, path: str) -> bool:
+        """Download an object to `path`; False if it does not exist."""
+        try:
+            await self._call(self._client.download_file, self.bucket, key, path)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+
+    async def delete(self, key: str):
+        await self._call(self._client.delete_object, Bucket=self.bucket, Key=key)
+
+    def presigned_url(self, key: str, ttl_s: int, content_type: str, disposition: str) -> Optional[str]:
+        # Signing is a local computation, no request is made. The response
+        # headers override whatever type the object was stored with.
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": disposition,
+            },
+            ExpiresIn=ttl_s,
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class DirectoryObjectStore:
+    """Cold tier in a plain directory, e.g. an NFS mount or a test stand-in for S3."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    async def put(self, key: str, path: str, content_type: Optional[str] = None):
+        loop = asyncio.get_running_loop()
+        tmp_path = os.path.join(self.root, f".{key}.part")
+        await loop.run_in_executor(None, shutil.copyfile, path, tmp_path)
+        os.replace(tmp_path, os.path.join(self.root, key))
+
+    async def fetch(self, key: str, path: str) -> bool:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, shutil.copyfile, os.path.join(self.root, key), path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def delete(self, key: str):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+    def presigned_url(self, key: str, ttl_s: int, content_type: str, disposition: str) -> Optional[str]:
+        return None
+
+    def close(self):
+        pass
+
+
+def create_object_store():
+    """The configured cold tier, or None to keep every file on local disk."""
+    backend = settings.storage_cold_backend
+    if backend == "s3":
+        if boto3 is None:
+            print("❌ storage_cold_backend=s3 but boto3 is not installed; files stay on local disk")
+            return None
+        return S3ObjectStore(
+            settings.s3_bucket, settings.s3_endpoint_url, settings.s3_region,
+            settings.s3_access_key, settings.s3_secret_key,
+        )
+    if backend == "directory":
+        if not settings.storage_cold_dir:
+            print("❌ storage_cold_backend=directory needs storage_cold_dir; files stay on local disk")
+            return None
+        return DirectoryObjectStore(settings.storage_cold_dir)
+    return None
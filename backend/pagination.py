@@ -0,0 +1,103 @@
+import base64
+from typing import Iterable, List, Optional, Tuple
+from bson import json_util
+from fastapi import HTTPException, Response
+from database import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# (field, direction) pairs; the last key must be unique (normally _id)
+SortSpec = List[Tuple[str, int]]
+
+
+def encode_cursor(values: dict) -> str:
+    raw = json_util.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def decode_offset(token: Optional[str]) -> int:
+    """Position in a ranked list from its cursor; 0 without one."""
+    if not token:
+        return 0
+    offset = decode_cursor(token).get("o")
+    if type(offset) is not int or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return settings.page_size_default
+    return min(limit, settings.page_size_max)
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str], required: Iterable[str]) -> Optional[dict]:
+    """Projection for a comma-separated `fields` parameter.
+
+    Required fields (the ones the response model cannot do without) are always
+    included; unknown names are ignored. Returns None for "whole document".
+    """
+    if not fields:
+        return None
+    allowed = set(allowed)
+    selected = set(required)
+    selected.update(f.strip() for f in fields.split(",") if f.strip() in allowed)
+    return {field: 1 for field in selected}
+
+
+def keyset_filter(sort: SortSpec, last: dict) -> dict:
+    """Filter matching documents strictly after `last` in `sort` order.
+
+    For sort keys (a, b, _id) this expands to
+    a > x  OR  (a == x AND b > y)  OR  (a == x AND b == y AND _id > z)
+    with the comparison flipped for descending keys.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev: last.get(prev) for prev, _ in sort[:i]}
+        clause[field] = {"$gt" if direction > 0 else "$lt": last.get(field)}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents plus the opaque token for the next page.
+
+    Reads limit + 1 documents to find out whether another page exists, so a
+    deep page costs the same index walk as the first one.
+    """
+    if cursor:
+        after = keyset_filter(sort, decode_cursor(cursor))
+        query = {"$and": [query, after]} if query else after
+    if projection is not None:
+        projection = dict(projection, **{field: 1 for field, _ in sort})
+
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    next_token = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_token = encode_cursor({field: docs[-1].get(field) for field, _ in sort})
+    return docs, next_token
+
+
+def set_next_cursor(response: Response, next_token: Optional[str]):
+    if next_token:
+        response.headers[NEXT_CURSOR_HEADER] = next_token
@@ -0,0 +1,233 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from bson import ObjectId
+from database import acquire_lease, get_db, settings
+from search_index import key_terms
+
+# PDF tooling is optional: PyMuPDF gives text, page count and thumbnails,
+# pypdf gives text and page count only. Without either, jobs still record
+# the sniffed type and mark the resource processed.
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_WIDTH = 320
+MAX_MISSING_RETRIES = 10
+
+
+def extract_pdf(path: str, thumbnail_path: str, max_chars: int) -> dict:
+    """Runs in a worker process: page count, leading text and a first-page thumbnail."""
+    result = {"pages": None, "extracted_text": "", "thumbnail": False}
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            result["pages"] = doc.page_count
+            parts, length = [], 0
+            for page in doc:
+                text = page.get_text()
+                parts.append(text)
+                length += len(text)
+                if length >= max_chars:
+                    break
+            result["extracted_text"] = "".join(parts)[:max_chars]
+            if doc.page_count:
+                first = doc[0]
+                zoom = THUMBNAIL_WIDTH / max(first.rect.width, 1)
+                first.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(thumbnail_path)
+                result["thumbnail"] = True
+    elif pypdf is not None:
+        reader = pypdf.PdfReader(path)
+        result["pages"] = len(reader.pages)
+        parts, length = [], 0
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            length += len(text)
+            if length >= max_chars:
+                break
+        result["extracted_text"] = "".join(parts)[:max_chars]
+    return result
+
+
+class ProcessingQueue:
+    """Post-upload processing (text extraction, thumbnails) off the request path.
+
+    Jobs are keyed by resource id and work on the resource's blob, so results
+    are computed once per unique file and cached on the `blobs` document;
+    re-uploads of a known PDF just copy them. Resource documents carry
+    `processing: pending|done|failed` plus an attempt count, which makes the
+    collection itself the durable queue: unfinished jobs are picked up again
+    at startup. Failed jobs are retried with exponential backoff.
+
+    Only `search_terms`, the `search_terms_per_document` most frequent words
+    of the text, is indexed for search; the full text stays on the document.
+    """
+
+    def __init__(self, blob_store, on_processed=None):
+        self.blob_store = blob_store
+        # Called with the resource id once its document has been updated
+        self.on_processed = on_processed
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = []
+        self._missing = {}
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, resource_id: ObjectId, delay: float = 0):
+        """Queue a resource for processing; never blocks the caller."""
+        key = str(resource_id)
+        if key in self._queued:
+            return
+        self._queued.add(key)
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, key)
+        else:
+            self._queue.put_nowait(key)
+
+    @property
+    def thumbnail_dir(self) -> str:
+        return os.path.join(self.blob_store.root, THUMBNAIL_DIR)
+
+    async def start(self):
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+        self._executor = ProcessPoolExecutor(max_workers=settings.processing_workers)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.processing_workers)]
+        await self.resume()
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _replace_executor(self):
+        """Swap in a fresh pool; the old one's processes may be stuck on a malformed PDF.
+
+        Other jobs running in the old pool fail with BrokenProcessPool and are retried.
+        """
+        old, self._executor = self._executor, ProcessPoolExecutor(max_workers=settings.processing_workers)
+        # shutdown() can't interrupt a running job, so stop the processes themselves
+        for process in list((old._processes or {}).values()):
+            process.terminate()
+        old.shutdown(wait=False, cancel_futures=True)
+
+    async def resume(self):
+        """Queue every resource still pending or failed (after restarts and reconnects)."""
+        db = get_db()
+        if db is None:
+            return
+        try:
+            if not await acquire_lease(db, "processing_resume", settings.processing_resume_lease_s):
+                return  # another worker has just queued them
+            async for doc in db.resources.find(
+                {"processing": {"$in": ["pending", "failed"]},
+                 "processing_attempts": {"$not": {"$gte": settings.processing_max_attempts}}},
+                {"_id": 1},
+            ):
+                self.submit(doc["_id"])
+        except Exception as e:
+            print(f"Processing resume error: {e}")
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            self._queued.discard(key)
+            try:
+                await self._process(ObjectId(key))
+            except Exception as e:
+                print(f"Processing error ({key}): {e}")
+
+    async def _process(self, resource_id: ObjectId):
+        db = get_db()
+        if db is None:
+            self.submit(resource_id, delay=settings.processing_retry_s)
+            return
+        resource = await db.resources.find_one(
+            {"_id": resource_id}, {"sha256": 1, "filename": 1, "content_type": 1, "processing": 1, "processing_attempts": 1}
+        )
+        if resource is None:
+            # Usually still in the write-behind queue; look again shortly, but
+            # give up on resources that were deleted before they were processed
+            key = str(resource_id)
+            self._missing[key] = self._missing.get(key, 0) + 1
+            if self._missing[key] <= MAX_MISSING_RETRIES:
+                self.submit(resource_id, delay=settings.processing_retry_s)
+            else:
+                del self._missing[key]
+            return
+        self._missing.pop(str(resource_id), None)
+        if resource.get("processing") == "done" or not resource.get("sha256"):
+            return
+
+        attempts = resource.get("processing_attempts", 0) + 1
+        try:
+            fields = await self._blob_results(db, resource)
+            if fields.get("extracted_text"):
+                fields = {**fields, "search_terms": key_terms(fields["extracted_text"], settings.search_terms_per_document)}
+        except Exception as e:
+            self.failed += 1
+            print(f"Processing failed for {resource_id} (attempt {attempts}): {e}")
+            await db.resources.update_one(
+                {"_id": resource_id},
+                {"$set": {"processing": "failed", "processing_attempts": attempts, "processing_error": str(e)}},
+            )
+            if attempts < settings.processing_max_attempts:
+                self.submit(resource_id, delay=settings.processing_retry_s * 2 ** attempts)
+            return
+
+        await db.resources.update_one(
+            {"_id": resource_id},
+            {"$set": {**fields, "processing": "done", "processing_attempts": attempts},
+             "$unset": {"processing_error": ""}},
+        )
+        self.processed += 1
+        if self.on_processed is not None:
+            await self.on_processed(resource_id)
+
+    async def _blob_results(self, db, resource: dict) -> dict:
+        sha256 = resource["sha256"]
+        blob = await db.blobs.find_one({"_id": sha256}) or {}
+        if blob.get("processed"):
+            return blob["processed"]
+
+        content_type = resource.get("content_type") or blob.get("content_type")
+        fields = {"content_type": content_type}
+        if content_type == "application/pdf":
+            path = await self.blob_store.local_path(resource["filename"])
+            if path is None:
+                raise FileNotFoundError(resource["filename"])
+            thumbnail_name = f"{sha256}.png"
+            loop = asyncio.get_running_loop()
+            try:
+                extracted = await asyncio.wait_for(loop.run_in_executor(
+                    self._executor, extract_pdf, path,
+                    os.path.join(self.thumbnail_dir, thumbnail_name), settings.extracted_text_max_chars,
+                ), settings.processing_timeout_s)
+            except asyncio.TimeoutError:
+                self._replace_executor()
+                raise RuntimeError(f"extraction timed out after {settings.processing_timeout_s}s")
+            fields["pages"] = extracted["pages"]
+            fields["extracted_text"] = extracted["extracted_text"]
+            fields["thumbnail"] = thumbnail_name if extracted["thumbnail"] else None
+
+        await db.blobs.update_one({"_id": sha256}, {"$set": {"processed": fields}})
+        return fields
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "processed": self.processed, "failed": self.failed}
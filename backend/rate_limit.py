@@ -0,0 +1,224 @@
+import asyncio
+import json
+import math
+import time
+from typing import Callable, Dict, Optional
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Receive, Scope, Send
+from auth import decode_token
+from cache import TTLCache
+from database import settings
+import metrics
+
+rejections = metrics.registry.counter(
+    "rate_limit_rejections_total", "Requests turned away by rate limits or admission control.", ("route_class", "reason"))
+
+# Atomic token bucket: refill by elapsed time, take one token or report the wait
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class MemoryBuckets:
+    """Per-process token buckets; the default.
+
+    Buckets live in a bounded LRU and expire once they would have refilled,
+    so idle clients cost nothing and a flood of distinct IPs cannot grow it.
+    """
+
+    def __init__(self, max_keys: int):
+        self._buckets = TTLCache(max_keys, 0)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate + 1)
+        return wait
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through a Redis-compatible server."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        wait = await self._script(keys=[f"rl:{key}"], args=[rate, burst, time.time()])
+        return float(wait)
+
+
+def create_buckets():
+    if settings.rate_limit_backend == "redis":
+        try:
+            return RedisBuckets(settings.redis_url)
+        except ImportError:
+            print("❌ rate_limit_backend=redis but the redis package is not installed; using in-process limits")
+    return MemoryBuckets(settings.rate_limit_max_clients)
+
+
+class AdmissionGate:
+    """Concurrency cap with a bounded wait queue.
+
+    Up to `limit` requests run at once and up to `max_queue` more wait for a
+    slot; anything beyond that is rejected immediately instead of queueing.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def full(self) -> bool:
+        return self.active >= self.limit and self.waiting >= self.max_queue
+
+    async def __aenter__(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    async def __aexit__(self, *exc):
+        self.active -= 1
+        self._slots.release()
+
+
+class LimitClass:
+    """Limits for one class of routes: a token bucket per client, an optional gate."""
+
+    def __init__(self, per_minute: int, burst: int, max_concurrent: int = 0):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.gate = AdmissionGate(max_concurrent, settings.admission_max_queue) if max_concurrent else None
+        self.allowed = 0
+        self.limited = 0
+        self.shed = 0
+
+    def stats(self) -> dict:
+        stats = {
+            "per_minute": round(self.rate * 60), "burst": self.burst,
+            "allowed": self.allowed, "rate_limited": self.limited, "shed": self.shed,
+        }
+        if self.gate is not None:
+            stats.update(max_concurrent=self.gate.limit, active=self.gate.active, waiting=self.gate.waiting)
+        return stats
+
+
+def client_key(scope: Scope) -> str:
+    """Signed-in users are limited per account, everyone else per client IP."""
+    headers = dict(scope.get("headers", []))
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return f"user:{decode_token(authorization[7:].strip())['sub']}"
+        except HTTPException:
+            pass
+    if settings.rate_limit_trust_proxy and b"x-forwarded-for" in headers:
+        return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimiter:
+    """Route classes and their limits.
+
+    `classify(method, path, query_string)` names the class of a request, or
+    returns None for routes that are not limited.
+    """
+
+    def __init__(self, buckets, classes: Dict[str, LimitClass],
+                 classify: Callable[[str, str, bytes], Optional[str]]):
+        self.buckets = buckets
+        self.classes = classes
+        self.classify = classify
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.buckets).__name__,
+            "classes": {name: limits.stats() for name, limits in self.classes.items()},
+        }
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limits (429) and concurrency caps (503) per route class.
+
+    Sits inside the response cache, so cached reads are never limited.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def _reject(self, send: Send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = self.limiter.classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        limits = self.limiter.classes.get(name) if name else None
+        if limits is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            wait = await self.limiter.buckets.take(f"{name}:{client_key(scope)}", limits.rate, limits.burst)
+        except Exception as e:
+            # Fail open: a broken limiter backend must not take the API down
+            print(f"Rate limit backend error: {e}")
+            wait = 0.0
+        if wait > 0:
+            limits.limited += 1
+            rejections.inc(name, "rate_limited")
+            await self._reject(send, 429, "Too many requests, slow down", wait)
+            return
+
+        gate = limits.gate
+        if gate is None:
+            limits.allowed += 1
+            await self.app(scope, receive, send)
+            return
+        if gate.full():
+            limits.shed += 1
+            rejections.inc(name, "overloaded")
+            await self._reject(send, 503, "Server is busy, try again shortly", 1)
+            return
+        limits.allowed += 1
+        async with gate:
+            await self.app(scope, receive, send)
@@ -0,0 +1,96 @@
+import asyncio
+from typing import List, Optional
+from database import connect_to_mongo, close_mongo_connection, get_db
+
+# One document per (teacher_name, subject):
+# {_id: {teacher_name, subject}, count, sum, hist: {"1": n, ..., "5": n}}
+STATS_COLLECTION = "rating_stats"
+STARS = range(1, 6)
+
+
+async def record_rating(db, rating: dict) -> None:
+    """Fold one new review into the running per-teacher/subject totals."""
+    stars = int(rating["rating"])
+    inc = {"count": 1, "sum": stars}
+    if stars in STARS:
+        inc[f"hist.{stars}"] = 1
+    await db[STATS_COLLECTION].update_one(
+        {"_id": {"teacher_name": rating["teacher_name"], "subject": rating["subject"]}},
+        {"$inc": inc},
+        upsert=True,
+    )
+
+
+def _histogram(hist: Optional[dict]) -> List[int]:
+    hist = hist or {}
+    return [int(hist.get(str(stars), 0)) for stars in STARS]
+
+
+def summarize(doc: dict) -> dict:
+    count = doc.get("count", 0)
+    return {
+        "teacher_name": doc["_id"]["teacher_name"],
+        "subject": doc["_id"]["subject"],
+        "count": count,
+        "mean": round(doc.get("sum", 0) / count, 2) if count else None,
+        "histogram": _histogram(doc.get("hist")),
+    }
+
+
+def combine(teacher_name: str, docs: List[dict]) -> dict:
+    """Roll the per-subject documents up into one summary for the teacher."""
+    count = sum(doc.get("count", 0) for doc in docs)
+    total = sum(doc.get("sum", 0) for doc in docs)
+    histograms = [_histogram(doc.get("hist")) for doc in docs]
+    return {
+        "teacher_name": teacher_name,
+        "count": count,
+        "mean": round(total / count, 2) if count else None,
+        "histogram": [sum(h[i] for h in histograms) for i in range(len(STARS))],
+        "subjects": [summarize(doc) for doc in docs],
+    }
+
+
+async def find_stats(db, teacher_name: Optional[str] = None, subject: Optional[str] = None) -> List[dict]:
+    query = {}
+    if teacher_name:
+        query["_id.teacher_name"] = teacher_name
+    if subject:
+        query["_id.subject"] = subject
+    return await db[STATS_COLLECTION].find(query).to_list(length=None)
+
+
+async def rebuild(db) -> int:
+    """Recompute every summary from the reviews collection in one pipeline."""
+    pipeline = [
+        {"$group": {
+            "_id": {"teacher_name": "$teacher_name", "subject": "$subject"},
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$rating"},
+            **{f"h{stars}": {"$sum": {"$cond": [{"$eq": ["$rating", stars]}, 1, 0]}} for stars in STARS},
+        }},
+        {"$project": {
+            "count": 1,
+            "sum": 1,
+            "hist": {str(stars): f"$h{stars}" for stars in STARS},
+        }},
+        {"$out": STATS_COLLECTION},
+    ]
+    await db.reviews.aggregate(pipeline).to_list(length=None)
+    return await db[STATS_COLLECTION].count_documents({})
+
+
+async def main():
+    await connect_to_mongo()
+    db = get_db()
+    try:
+        if db is None:
+            return
+        rebuilt = await rebuild(db)
+        print(f"Rebuilt rating summaries for {rebuilt} teacher/subject pairs.")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+import pickle
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from cache import TTLCache
+from database import settings
+
+# Cached entry: (status, [(header, value), ...], body)
+Entry = Tuple[int, List[Tuple[bytes, bytes]], bytes]
+
+# Headers describing the original exchange rather than the payload
+SKIP_HEADERS = {b"content-length", b"date", b"server", b"x-cache"}
+
+
+class MemoryBackend:
+    """Per-process LRU with TTL; the default."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._generations: Dict[str, int] = {}
+
+    async def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    async def bump(self, namespace: str):
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    async def get(self, key: str) -> Optional[Entry]:
+        return self._entries.get(key)
+
+    async def set(self, key: str, entry: Entry):
+        self._entries.set(key, entry)
+
+
+class RedisBackend:
+    """Shared cache on a Redis-compatible server, for multi-worker deployments."""
+
+    def __init__(self, url: str, ttl: float):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self.ttl = int(ttl)
+
+    async def generation(self, namespace: str) -> int:
+        value = await self._redis.get(f"rc:gen:{namespace}")
+        return int(value) if value else 0
+
+    async def bump(self, namespace: str):
+        await self._redis.incr(f"rc:gen:{namespace}")
+
+    async def get(self, key: str) -> Optional[Entry]:
+        raw = await self._redis.get(f"rc:{key}")
+        return pickle.loads(raw) if raw else None
+
+    async def set(self, key: str, entry: Entry):
+        await self._redis.set(f"rc:{key}", pickle.dumps(entry), ex=self.ttl)
+
+
+def normalize_query(query_string: bytes) -> str:
+    """Canonical form of a query string, so equivalent filter combos share a key.
+
+    Empty values are dropped, parameters are sorted, comma-separated lists
+    (course=CS101,BCA) are sorted, and search text is case/space-folded the
+    same way the search index tokenizes it. Cursors are kept verbatim.
+    """
+    params = []
+    for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=False):
+        if name == "search":
+            value = " ".join(value.lower().split())
+        elif name != "cursor" and "," in value:
+            value = ",".join(sorted(v.strip() for v in value.split(",") if v.strip()))
+        params.append((name, value))
+    params.sort()
+    return "&".join(f"{name}={value}" for name, value in params)
+
+
+class ResponseCache:
+    """Caches whole GET responses per namespace.
+
+    Every key embeds the namespace's generation number; write endpoints call
+    invalidate(namespace), which bumps the generation so all older entries
+    become unreachable at once (and age out of the LRU / Redis TTL).
+    """
+
+    def __init__(self, backend, routes: Dict[str, str], prefixes: Dict[str, str]):
+        self.backend = backend
+        self.routes = routes
+        self.prefixes = prefixes
+        self.max_entry_bytes = settings.cache_max_entry_kb * 1024
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.invalidations: Dict[str, int] = {}
+
+    def namespace_for(self, path: str) -> Optional[str]:
+        namespace = self.routes.get(path)
+        if namespace is None:
+            for prefix, ns in self.prefixes.items():
+                if path.startswith(prefix):
+                    return ns
+        return namespace
+
+    async def key_for(self, namespace: str, path: str, query_string: bytes, variant: str = "") -> str:
+        generation = await self.backend.generation(namespace)
+        key = f"{namespace}:{generation}:{path}?{normalize_query(query_string)}"
+        return f"{key}|{variant}" if variant else key
+
+    async def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.invalidations[namespace] = self.invalidations.get(namespace, 0) + 1
+            try:
+                await self.backend.bump(namespace)
+            except Exception as e:
+                print(f"Cache invalidation error ({namespace}): {e}")
+
+    async def invalidate_all(self):
+        await self.invalidate(*sorted(set(self.routes.values()) | set(self.prefixes.values())))
+
+    def stats(self) -> dict:
+        namespaces = set(self.hits) | set(self.misses) | set(self.invalidations)
+        return {
+            "backend": type(self.backend).__name__,
+            "namespaces": {
+                ns: {
+                    "hits": self.hits.get(ns, 0),
+                    "misses": self.misses.get(ns, 0),
+                    "invalidations": self.invalidations.get(ns, 0),
+                }
+                for ns in sorted(namespaces)
+            },
+        }
+
+
+def create_backend():
+    if settings.cache_backend == "redis":
+        try:
+            return RedisBackend(settings.redis_url, settings.cache_ttl_s)
+        except ImportError:
+            print("❌ cache_backend=redis but the redis package is not installed; using in-process cache")
+    return MemoryBackend(settings.cache_max_entries, settings.cache_ttl_s)
+
+
+class ResponseCacheMiddleware:
+    """Serves cached GET responses for the routes registered on the cache.
+
+    Must sit inside CORSMiddleware so per-origin CORS headers are added to
+    each response rather than stored in the cache. `variant(scope)` names the
+    representation a request gets (e.g. its negotiated content encoding) so
+    each one is cached separately.
+    """
+
+    def __init__(self, app: ASGIApp, cache: ResponseCache, variant: Optional[Callable[[Scope], str]] = None):
+        self.app = app
+        self.cache = cache
+        self.variant = variant
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        namespace = self.cache.namespace_for(scope["path"])
+        if namespace is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            variant = self.variant(scope) if self.variant is not None else ""
+            key = await self.cache.key_for(namespace, scope["path"], scope.get("query_string", b""), variant)
+            entry = await self.cache.backend.get(key)
+        except Exception as e:
+            print(f"Cache lookup error: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        if entry is not None:
+            self.cache.hits[namespace] = self.cache.hits.get(namespace, 0) + 1
+            status, headers, body = entry
+            headers = headers + [(b"content-length", str(len(body)).encode()), (b"x-cache", b"HIT")]
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.cache.misses[namespace] = self.cache.misses.get(namespace, 0) + 1
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        cacheable = True
+
+        async def capture(message: Message):
+            nonlocal start, size, cacheable
+            if message["type"] == "http.response.start":
+                # Snapshot: outer middleware (CORS) edits the sent headers in place
+                start = {**message, "headers": list(message.get("headers", []))}
+                cacheable = message["status"] == 200
+                message["headers"] = list(message.get("headers", [])) + [(b"x-cache", b"MISS")]
+            elif message["type"] == "http.response.body" and cacheable:
+                size += len(message.get("body", b""))
+                if size > self.cache.max_entry_bytes:
+                    cacheable = False
+                    chunks.clear()
+                else:
+                    chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and cacheable:
+                    headers = [(k, v) for k, v in start["headers"] if k.lower() not in SKIP_HEADERS]
+                    try:
+                        await self.cache.backend.set(key, (start["status"], headers, b"".join(chunks)))
+                    except Exception as e:
+                        print(f"Cache store error: {e}")
+            await send(message)
+
+        await self.app(scope, receive, capture)
@@ -0,0 +1,387 @@
+import asyncio
+import bisect
+import heapq
+import math
+import re
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from database import get_db, settings
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Matches in the title count more than matches buried in the description
+# `search_terms` is a handful of key terms from the PDF text (see key_terms)
+FIELD_WEIGHTS = {"title": 3.0, "subject": 2.0, "course": 2.0, "description": 1.0, "search_terms": 0.5}
+# Exact-match list filters, answered from the index so a search never round-trips ids through Mongo
+FILTER_FIELDS = ("course", "subject", "type", "semester", "year", "privacy")
+INDEXED_FIELDS = {field: 1 for field in (*FIELD_WEIGHTS, *FILTER_FIELDS)}
+
+# A one-letter prefix can match a large part of the vocabulary; only the first
+# few expansions are scored
+MAX_PREFIX_EXPANSIONS = 64
+
+NOTHING: Set[str] = frozenset()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def key_terms(text: Optional[str], limit: int) -> str:
+    """The `limit` most frequent distinct words of a document body.
+
+    Body text is never indexed whole: every token costs postings memory in
+    every worker. Short words and numbers are skipped as they rarely
+    identify a document.
+    """
+    counts: Dict[str, int] = {}
+    for token in tokenize(text):
+        if len(token) > 3 and not token.isdigit():
+            counts[token] = counts.get(token, 0) + 1
+    return " ".join(heapq.nlargest(limit, counts, key=counts.__getitem__))
+
+
+def regex_fallback(search: str) -> dict:
+    """Case-insensitive match on the indexed fields with the input escaped."""
+    pattern = {"$regex": re.escape(search), "$options": "i"}
+    return {"$or": [{field: pattern} for field in FIELD_WEIGHTS]}
+
+
+def _filter_value(value) -> bool:
+    # Facets skip missing/empty values, like the $facet pipeline's $nin [None, ""]
+    return isinstance(value, (str, int, float)) and value != ""
+
+
+class SearchIndex:
+    """In-process inverted index over the text fields of `resources`.
+
+    Postings map token -> weighted term frequency -> ids. The sorted
+    vocabulary allows prefix lookups for the last (still being typed) query
+    term. Results are ranked with a tf-idf score and every query term has to
+    match (exactly, or by prefix for the last term).
+
+    Field weights give a token only a handful of distinct frequencies, so a
+    query's matches fall into a few classes of equal score. Matching,
+    filtering and scoring are set operations on those groups, and a page
+    only orders the ids of the classes it draws from. The list filter fields
+    are kept as value -> ids sets as well, so filters and facet counts for a
+    search never send id lists to Mongo. Rebuilds happen on a thread from a
+    snapshot of the collection.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[float, Set[str]]] = {}
+        self._doc_tokens: Dict[str, Dict[str, float]] = {}
+        self._vocab: List[str] = []
+        # field -> value -> ids, and each id's values for removal
+        self._by_value: Dict[str, Dict[object, Set[str]]] = {field: {} for field in FILTER_FIELDS}
+        self._doc_values: Dict[str, Tuple] = {}
+        # Filter sets are reused while someone types (same filters, new text)
+        # until the next change to the index
+        self._allowed_cache: Dict[tuple, Optional[Set[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Changes made while a rebuild is scanning the collection are replayed onto it
+        self._replay: Optional[List[Tuple[str, object]]] = None
+        # One rebuild at a time: the periodic one and an explicit load() may overlap
+        self._loading = asyncio.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, doc: dict):
+        if self._replay is not None:
+            self._replay.append(("add", doc))
+        for token in self._index(doc):
+            bisect.insort(self._vocab, token)
+
+    def _index(self, doc: dict) -> List[str]:
+        """Index one document; returns the tokens new to the vocabulary."""
+        doc_id = str(doc["_id"])
+        self._remove(doc_id)
+        self._allowed_cache.clear()
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc.get(field)):
+                weights[token] = weights.get(token, 0.0) + weight
+        new_tokens = []
+        for token, weight in weights.items():
+            groups = self._postings.get(token)
+            if groups is None:
+                groups = self._postings[token] = {}
+                new_tokens.append(token)
+            groups.setdefault(weight, set()).add(doc_id)
+        self._doc_tokens[doc_id] = weights
+        values = tuple(doc.get(field) for field in FILTER_FIELDS)
+        for field, value in zip(FILTER_FIELDS, values):
+            if _filter_value(value):
+                self._by_value[field].setdefault(value, set()).add(doc_id)
+        self._doc_values[doc_id] = values
+        return new_tokens
+
+    def remove(self, doc_id: str):
+        if self._replay is not None:
+            self._replay.append(("remove", doc_id))
+        self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        doc_id = str(doc_id)
+        self._allowed_cache.clear()
+        for token, weight in self._doc_tokens.pop(doc_id, {}).items():
+            groups = self._postings.get(token)
+            ids = groups.get(weight) if groups is not None else None
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    # An emptied token stays in the vocabulary; it is skipped at query time
+                    del groups[weight]
+        for field, value in zip(FILTER_FIELDS, self._doc_values.pop(doc_id, ())):
+            ids = self._by_value[field].get(value) if _filter_value(value) else None
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._by_value[field][value]
+
+    def _expand(self, prefix: str) -> List[str]:
+        matches = []
+        for i in range(bisect.bisect_left(self._vocab, prefix), len(self._vocab)):
+            token = self._vocab[i]
+            if not token.startswith(prefix):
+                break
+            if self._postings.get(token):
+                matches.append(token)
+                if len(matches) >= MAX_PREFIX_EXPANSIONS:
+                    break
+        return matches
+
+    def _allowed(self, filters: dict, skip: Optional[str] = None) -> Optional[Set[str]]:
+        """Ids passing the filters (except `skip`), or None when nothing is filtered.
+
+        `filters` is the Mongo query built for the list endpoint: a value or
+        {"$in": [...]} per filter field.
+        """
+        conditions = []
+        for field, condition in filters.items():
+            if field == skip:
+                continue
+            if field not in self._by_value:
+                raise ValueError(f"{field} is not a filter field of the search index")
+            values = condition["$in"] if isinstance(condition, dict) else [condition]
+            conditions.append((field, tuple(values)))
+        key = tuple(sorted(conditions, key=repr))
+        if key in self._allowed_cache:
+            return self._allowed_cache[key]
+
+        allowed: Optional[Set[str]] = None
+        for field, values in key:
+            sets = [self._by_value[field].get(value, NOTHING) for value in values]
+            # A single value's set is shared, never copied; results are only read
+            ids = sets[0] if len(sets) == 1 else set().union(*sets)
+            allowed = ids if allowed is None else allowed & ids
+            if not allowed:
+                allowed = NOTHING
+                break
+        if len(self._allowed_cache) >= 256:
+            self._allowed_cache.clear()
+        self._allowed_cache[key] = allowed
+        return allowed
+
+    def _terms(self, text: str) -> List[Tuple[str, List[str]]]:
+        """Each query term with the tokens it matches; empty if any term matches nothing."""
+        terms = tokenize(text)
+        expanded = []
+        for i, term in enumerate(terms):
+            tokens = self._expand(term) if i == len(terms) - 1 else [term]
+            tokens = [token for token in tokens if self._postings.get(token)]
+            if not tokens:
+                return []
+            expanded.append((term, tokens))
+        return expanded
+
+    def _df(self, token: str) -> int:
+        return sum(map(len, self._postings[token].values()))
+
+    def _term_classes(self, term: str, tokens: List[str]) -> List[Tuple[float, Set[str], Set[str]]]:
+        """The term's matches as disjoint (score, ids, excluded) classes.
+
+        A class holds `ids` minus `excluded`. The weight groups of the term's
+        most common token are used as they are (no copy), with the ids it
+        shares with other completions of a prefix excluded; those shared ids
+        are split further by each completion.
+        """
+        total = max(len(self._doc_tokens), 1)
+        factors = {}
+        for token in tokens:
+            idf = math.log(1 + total / self._df(token))
+            # Exact hits rank above prefix completions
+            factors[token] = idf * (1.0 if token == term else 0.5)
+        tokens = sorted(tokens, key=self._df, reverse=True)
+        common, rest = tokens[0], tokens[1:]
+
+        seen: Set[str] = set()
+        shared: Set[str] = set()
+        for token in rest:
+            for ids in self._postings[token].values():
+                shared |= seen & ids
+                seen |= ids
+        if seen:
+            for ids in self._postings[common].values():
+                shared |= seen & ids
+        classes = [(weight * factors[common], ids, shared) for weight, ids in self._postings[common].items()]
+        for token in rest:
+            for weight, ids in self._postings[token].items():
+                only = ids - shared
+                if only:
+                    classes.append((weight * factors[token], only, NOTHING))
+        if shared:
+            split = [(0.0, shared)]
+            for token in tokens:
+                for weight, ids in self._postings[token].items():
+                    hit = ids & shared
+                    if not hit:
+                        continue
+                    refined = []
+                    for score, part in split:
+                        inside = part & hit
+                        if inside:
+                            refined.append((score + weight * factors[token], inside))
+                            if len(inside) < len(part):
+                                refined.append((score, part - inside))
+                        else:
+                            refined.append((score, part))
+                    split = refined
+            classes += [(score, ids, NOTHING) for score, ids in split]
+        return classes
+
+    def _classes(self, expanded: List[Tuple[str, List[str]]],
+                 allowed: Optional[Set[str]]) -> List[Tuple[float, Set[str], Set[str]]]:
+        """Matches of every term (and the filters) as (score, ids, excluded) classes, best first."""
+        per_term = sorted((self._term_classes(term, tokens) for term, tokens in expanded),
+                          key=lambda classes: sum(len(ids) for _, ids, _ in classes))
+        classes = per_term[0]
+        if allowed is not None:
+            classes = [(score, (ids & allowed) - excluded, NOTHING) for score, ids, excluded in classes]
+        for other in per_term[1:]:
+            combined = []
+            for score, ids, excluded in classes:
+                for other_score, other_ids, other_excluded in other:
+                    both = ids & other_ids
+                    if both:
+                        combined.append((score + other_score, both - excluded - other_excluded, NOTHING))
+            classes = combined
+        classes = [(score, ids, excluded) for score, ids, excluded in classes if ids]
+        classes.sort(key=itemgetter(0), reverse=True)
+        return classes
+
+    def _matches(self, text: str) -> Set[str]:
+        expanded = self._terms(text)
+        if not expanded:
+            return set()
+        return set().union(*(ids - excluded for _, ids, excluded in self._classes(expanded, None)))
+
+    def search(self, text: str, filters: Optional[dict] = None, offset: int = 0,
+               limit: Optional[int] = None) -> Tuple[List[Tuple[str, float]], int]:
+        """(ids with scores, best first, from `offset`; total number of matches).
+
+        Within a score class newer ids come first, so offset pages are stable.
+        """
+        expanded = self._terms(text)
+        if not expanded:
+            return [], 0
+        allowed = self._allowed(filters or {})
+        if allowed is not None and not allowed:
+            return [], 0
+        classes = self._classes(expanded, allowed)
+        sizes = [len(ids) - (len(ids & excluded) if excluded else 0) for _, ids, excluded in classes]
+        total = sum(sizes)
+        page: List[Tuple[str, float]] = []
+        skip, wanted = offset, total if limit is None else limit
+        for (score, ids, excluded), size in zip(classes, sizes):
+            if wanted <= 0:
+                break
+            if skip >= size:
+                skip -= size
+                continue
+            members = (doc_id for doc_id in ids if doc_id not in excluded) if excluded else ids
+            take = skip + wanted
+            ordered = heapq.nlargest(take, members) if take < size else sorted(members, reverse=True)
+            page += [(doc_id, score) for doc_id in ordered[skip:take]]
+            wanted -= len(ordered) - skip
+            skip = 0
+        return page, total
+
+    def facet_counts(self, text: str, filters: dict, fields: Iterable[str]) -> Dict[str, Dict[object, int]]:
+        """Per field, value -> number of matches; each field ignores its own filter."""
+        matches = self._matches(text)
+        counts: Dict[str, Dict[object, int]] = {}
+        for field in fields:
+            allowed = self._allowed(filters, skip=field)
+            base = matches if allowed is None else matches & allowed
+            counts[field] = {}
+            if not base:
+                continue
+            for value, ids in self._by_value[field].items():
+                count = len(base & ids)
+                if count:
+                    counts[field][value] = count
+        return counts
+
+    @classmethod
+    def build(cls, docs: List[dict]) -> "SearchIndex":
+        """A fresh index over `docs`, with the vocabulary sorted once at the end."""
+        index = cls()
+        for doc in docs:
+            index._index(doc)
+        index._vocab = sorted(index._postings)
+        return index
+
+    async def load(self) -> bool:
+        async with self._loading:
+            return await self._load()
+
+    async def _load(self) -> bool:
+        db = get_db()
+        if db is None:
+            return False
+        self._replay = []
+        try:
+            docs = await db.resources.find({}, INDEXED_FIELDS).to_list(length=None)
+            # Building is CPU-bound; a thread keeps the event loop serving meanwhile
+            fresh = await asyncio.get_running_loop().run_in_executor(None, SearchIndex.build, docs)
+        except Exception as e:
+            print(f"Search index load error: {e}")
+            return False
+        finally:
+            replay, self._replay = self._replay, None
+        for op, arg in replay:
+            if op == "add":
+                fresh.add(arg)
+            else:
+                fresh.remove(arg)
+        self._postings, self._doc_tokens, self._vocab = fresh._postings, fresh._doc_tokens, fresh._vocab
+        self._by_value, self._doc_values = fresh._by_value, fresh._doc_values
+        self.ready = True
+        return True
+
+    async def _run(self):
+        # Periodic rebuild picks up writes made by other workers or scripts
+        while True:
+            if await self.load():
+                await asyncio.sleep(settings.search_index_refresh_s)
+            else:
+                await asyncio.sleep(5)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,67 @@
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Type
+from bson import ObjectId
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+# orjson is optional: several times faster than the stdlib encoder and
+# handles datetimes natively. Without it responses fall back to json.dumps.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for trusted, already-shaped content.
+
+    Returning one of these from a route skips FastAPI's response_model
+    validation and jsonable_encoder pass; the route's response_model still
+    documents the schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class DocumentShaper:
+    """Turns Mongo documents into a model's JSON shape without validating them.
+
+    Produces exactly what response_model would: every model field in
+    declaration order, defaults for missing ones, extra keys dropped, and the
+    ObjectId `_id` as the string `id`. Documents come from our own writes,
+    which already went through the models, so per-field validation is skipped.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.fields = [name for name in model.model_fields if name != "id"]
+        self.has_id = "id" in model.model_fields
+        self.defaults = {
+            name: (None if field.is_required() else field.get_default(call_default_factory=True))
+            for name, field in model.model_fields.items()
+        }
+
+    def shape(self, doc: dict) -> dict:
+        get, defaults = doc.get, self.defaults
+        out = {"id": str(doc["_id"]) if "_id" in doc else get("id")} if self.has_id else {}
+        for name in self.fields:
+            out[name] = get(name, defaults[name])
+        return out
+
+    def shape_many(self, docs: Iterable[dict]) -> List[dict]:
+        return [self.shape(doc) for doc in docs]
@@ -0,0 +1,111 @@
+"""Production launcher: one API worker process per CPU core.
+
+    python serve.py                      # SERVER_WORKERS / one per core
+    python serve.py --workers 8 --port 8000
+
+With gunicorn installed the app is imported once in the master and forked
+(preload), so workers skip the import cost and share its memory pages;
+otherwise uvicorn's own supervisor starts each worker from scratch.
+
+Workers share nothing but MongoDB (and Redis, if configured): each has its
+own caches, search index, buffered counters and write queue. Only one
+worker creates indexes at startup (a lease in Mongo, see indexes.py). On
+SIGTERM a worker stops accepting connections, reports not-ready, closes
+live-update streams, finishes open requests within GRACEFUL_TIMEOUT_S and
+then flushes its counters, write queue and trending scores.
+"""
+import argparse
+import os
+from database import settings
+
+# gunicorn is optional: without it workers are started by uvicorn, without preload
+try:
+    import gunicorn
+except ImportError:
+    gunicorn = None
+
+
+def size_per_worker(workers: int):
+    """Split per-process pools across workers unless configured explicitly.
+
+    Applied to the loaded settings (a preloaded app is imported after this)
+    and to the environment (spawned workers read their own settings).
+    """
+    share = max(1, (os.cpu_count() or 1) // workers)
+    defaults = {
+        "password_hash_workers": share,
+        "processing_workers": share,
+        # A signup on one worker can't evict another worker's cached
+        # "no such account" entry, so keep that window short
+        "unknown_email_cache_ttl_s": 5,
+    }
+    for name, value in defaults.items():
+        if name not in settings.model_fields_set:
+            setattr(settings, name, value)
+            os.environ[name.upper()] = str(value)
+
+
+def run_gunicorn(args, workers: int):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("graceful_timeout", args.graceful_timeout)
+            self.cfg.set("keepalive", 5)
+
+        def load(self):
+            from main import app
+            return app
+
+    Application().run()
+
+
+def run_uvicorn(args, workers: int):
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 = one per core)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--graceful-timeout", type=int, default=None, help="seconds open requests get on shutdown")
+    args = parser.parse_args()
+
+    workers = args.workers if args.workers is not None else settings.server_workers
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        size_per_worker(workers)
+    args.host = args.host or settings.server_host
+    args.port = args.port or settings.server_port
+    args.graceful_timeout = args.graceful_timeout or settings.graceful_timeout_s
+
+    if workers > 1 and settings.cache_backend != "redis":
+        print(f"⚠️  {workers} workers with the in-process response cache: a write invalidates only its own "
+              f"worker's entries, so others may serve lists up to {settings.cache_ttl_s}s old "
+              f"(set CACHE_BACKEND=redis to share it)")
+    if workers > 1 and settings.rate_limit_enabled and settings.rate_limit_backend != "redis":
+        print(f"⚠️  Rate limits are per worker: clients get up to {workers}x the configured rate "
+              f"(set RATE_LIMIT_BACKEND=redis to share them)")
+
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port}")
+    if gunicorn is not None:
+        run_gunicorn(args, workers)
+    else:
+        print("gunicorn is not installed; starting workers with uvicorn (no preload)")
+        run_uvicorn(args, workers)
+
+
+if __name__ == "__main__":
+    main()
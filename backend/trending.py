@@ -0,0 +1,278 @@
+import asyncio
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from database import get_db, settings
+
+TRENDING_COLLECTION = "trending"
+EPOCH_ID = "_epoch"
+# Per-event weights: a download says more about a resource than a view
+WEIGHTS = {"download": 1.0, "view": 0.25}
+# Segments a resource is ranked in, besides the global one
+SEGMENT_FIELDS = ["course", "semester", "college"]
+# Rebase the reference time long before 2**exponent nears the float range
+MAX_EXPONENT = 512
+# Decayed scores below this are forgotten
+MIN_SCORE = 0.01
+
+Meta = Tuple[Optional[str], Optional[int], Optional[str]]
+
+
+def segment_key(field: Optional[str] = None, value=None) -> str:
+    return "all" if field is None else f"{field}:{value}"
+
+
+def segment_keys(meta: Meta) -> List[str]:
+    keys = [segment_key()]
+    for field, value in zip(SEGMENT_FIELDS, meta):
+        if value not in (None, ""):
+            keys.append(segment_key(field, value))
+    return keys
+
+
+class TopK:
+    """Exact top-k over scores that only ever grow.
+
+    `members` holds the current top-k; the heap orders them for eviction,
+    with outdated entries skipped lazily. Since a score never decreases,
+    anything outside the set is at or below the set's minimum and can only
+    get in by passing it.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.members: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def _min(self) -> Tuple[float, str]:
+        while self._heap[0][0] != self.members.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def update(self, doc_id: str, score: float):
+        if doc_id in self.members or len(self.members) < self.k:
+            self.members[doc_id] = score
+        elif score > self._min()[0]:
+            _, evicted = heapq.heappop(self._heap)
+            del self.members[evicted]
+            self.members[doc_id] = score
+        else:
+            return
+        heapq.heappush(self._heap, (score, doc_id))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(s, d) for d, s in self.members.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, doc_id: str):
+        self.members.pop(doc_id, None)
+
+    def top(self, n: int) -> List[Tuple[str, float]]:
+        return heapq.nlargest(n, self.members.items(), key=lambda item: item[1])
+
+
+class TrendingRanker:
+    """Time-decayed popularity per resource, ranked globally and per segment.
+
+    Scores halve every `trending_half_life_h` hours. They are kept relative
+    to a reference time t0 (an event at time t adds
+    weight * 2**((t - t0) / half_life)), so stored scores never need to be
+    decayed and their order never changes; the decayed value is only
+    computed for output. Each segment (all, course:X, semester:N,
+    college:Y) keeps an exact top-k, so a top-N query reads k entries.
+
+    record() is O(1) and never touches the database. A background task
+    resolves the segments of newly seen resources in one query per tick,
+    checkpoints score deltas to Mongo with $inc (so several workers can
+    share the collection) and periodically reloads the merged totals.
+    """
+
+    def __init__(self):
+        self.half_life_s = settings.trending_half_life_h * 3600
+        self.k = settings.trending_top_k
+        self.t0: Optional[float] = None
+        self._scores: Dict[str, float] = {}
+        self._meta: Dict[str, Meta] = {}
+        self._segments: Dict[str, TopK] = {}
+        # Events waiting for their resource's segments: (id, weight, time)
+        self._pending: List[Tuple[str, float, float]] = []
+        # Score added since the last checkpoint
+        self._deltas: Dict[str, float] = {}
+        self._removed: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+
+    def _growth(self, at: float) -> float:
+        return 2 ** ((at - self.t0) / self.half_life_s)
+
+    def record(self, resource_id, event: str = "download"):
+        self.events += 1
+        self._pending.append((str(resource_id), WEIGHTS[event], time.time()))
+
+    def remove(self, resource_id):
+        doc_id = str(resource_id)
+        self._scores.pop(doc_id, None)
+        self._meta.pop(doc_id, None)
+        self._deltas.pop(doc_id, None)
+        for segment in self._segments.values():
+            segment.discard(doc_id)
+        self._removed.add(doc_id)
+
+    def _apply(self, doc_id: str, amount: float):
+        score = self._scores.get(doc_id, 0.0) + amount
+        self._scores[doc_id] = score
+        for key in segment_keys(self._meta[doc_id]):
+            segment = self._segments.get(key)
+            if segment is None:
+                segment = self._segments[key] = TopK(self.k)
+            segment.update(doc_id, score)
+
+    def top(self, n: int, field: Optional[str] = None, value=None) -> List[Tuple[str, float]]:
+        """The n highest (id, decayed score) pairs of one segment."""
+        segment = self._segments.get(segment_key(field, value))
+        if segment is None or self.t0 is None:
+            return []
+        scale = 1 / self._growth(time.time())
+        return [(doc_id, score * scale) for doc_id, score in segment.top(n)]
+
+    # Background work
+
+    async def _drain(self, db):
+        if not self._pending or self.t0 is None:
+            return
+        pending, self._pending = self._pending, []
+        unknown = {doc_id for doc_id, _, _ in pending if doc_id not in self._meta and ObjectId.is_valid(doc_id)}
+        if unknown:
+            async for doc in db.resources.find(
+                {"_id": {"$in": [ObjectId(doc_id) for doc_id in unknown]}},
+                {field: 1 for field in SEGMENT_FIELDS},
+            ):
+                self._meta[str(doc["_id"])] = tuple(doc.get(field) for field in SEGMENT_FIELDS)
+        for doc_id, weight, at in pending:
+            if doc_id not in self._meta or doc_id in self._removed:
+                continue  # deleted, or not a resource id
+            amount = weight * self._growth(at)
+            self._deltas[doc_id] = self._deltas.get(doc_id, 0.0) + amount
+            self._apply(doc_id, amount)
+
+    async def _sync_epoch(self, db):
+        doc = await db[TRENDING_COLLECTION].find_one_and_update(
+            {"_id": EPOCH_ID}, {"$setOnInsert": {"t0": time.time()}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+        t0 = doc["t0"]
+        if self.t0 is not None and t0 != self.t0:
+            # Another worker rebased: move unflushed deltas to the new reference
+            factor = 2 ** ((self.t0 - t0) / self.half_life_s)
+            self._deltas = {doc_id: delta * factor for doc_id, delta in self._deltas.items()}
+        self.t0 = t0
+
+    async def _rebase(self, db):
+        now = time.time()
+        if (now - self.t0) / self.half_life_s < MAX_EXPONENT:
+            return
+        won = await db[TRENDING_COLLECTION].find_one_and_update(
+            {"_id": EPOCH_ID, "t0": self.t0}, {"$set": {"t0": now}},
+        )
+        if won is not None:
+            factor = 2 ** ((self.t0 - now) / self.half_life_s)
+            await db[TRENDING_COLLECTION].update_many({"score": {"$exists": True}}, {"$mul": {"score": factor}})
+
+    async def checkpoint(self, db):
+        await self._drain(db)
+        await self._sync_epoch(db)
+        ops = [DeleteOne({"_id": ObjectId(doc_id)}) for doc_id in self._removed]
+        deltas = self._deltas
+        ops += [
+            UpdateOne(
+                {"_id": ObjectId(doc_id)},
+                {"$inc": {"score": delta}, "$set": dict(zip(SEGMENT_FIELDS, self._meta[doc_id]))},
+                upsert=True,
+            )
+            for doc_id, delta in deltas.items() if doc_id in self._meta
+        ]
+        if ops:
+            self._deltas, removed, self._removed = {}, self._removed, set()
+            try:
+                await db[TRENDING_COLLECTION].bulk_write(ops, ordered=False)
+            except Exception:
+                # Keep the deltas for the next attempt
+                for doc_id, delta in deltas.items():
+                    self._deltas[doc_id] = self._deltas.get(doc_id, 0.0) + delta
+                self._removed |= removed
+                raise
+        # Forget resources whose decayed score no longer matters
+        await db[TRENDING_COLLECTION].delete_many({"score": {"$lt": MIN_SCORE * self._growth(time.time())}})
+        await self._rebase(db)
+
+    async def load(self, db):
+        """Rebuild the in-memory rankings from the checkpointed totals of all workers."""
+        await self._sync_epoch(db)
+        floor = MIN_SCORE * self._growth(time.time())
+        scores, meta = {}, {}
+        async for doc in db[TRENDING_COLLECTION].find({"score": {"$gte": floor}}):
+            doc_id = str(doc["_id"])
+            scores[doc_id] = doc["score"]
+            meta[doc_id] = tuple(doc.get(field) for field in SEGMENT_FIELDS)
+        for doc_id in self._deltas:
+            if doc_id in self._meta:
+                meta.setdefault(doc_id, self._meta[doc_id])
+        self._scores, self._meta, self._segments = {}, meta, {}
+        for doc_id, score in scores.items():
+            self._apply(doc_id, score)
+        # Deltas not checkpointed yet (recorded while loading) go on top
+        for doc_id, delta in self._deltas.items():
+            if doc_id in self._meta:
+                self._apply(doc_id, delta)
+
+    async def _run(self):
+        last_checkpoint = last_load = time.monotonic()
+        loaded = False
+        while True:
+            await asyncio.sleep(1)
+            db = get_db()
+            if db is None:
+                continue
+            now = time.monotonic()
+            try:
+                if not loaded or now - last_load >= settings.trending_refresh_s:
+                    if loaded:
+                        await self.checkpoint(db)
+                    await self.load(db)
+                    loaded, last_load = True, now
+                elif now - last_checkpoint >= settings.trending_checkpoint_s:
+                    await self.checkpoint(db)
+                    last_checkpoint = now
+                else:
+                    await self._drain(db)
+            except Exception as e:
+                print(f"Trending update error: {e}")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        db = get_db()
+        if db is not None and self.t0 is not None:
+            try:
+                await self.checkpoint(db)
+            except Exception as e:
+                print(f"Trending checkpoint error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "pending": len(self._pending),
+            "tracked": len(self._scores),
+            "segments": len(self._segments),
+            "unsaved": len(self._deltas),
+        }
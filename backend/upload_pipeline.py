@@ -0,0 +1,213 @@
+import hashlib
+import json
+import mimetypes
+import os
+import uuid
+from typing import Dict, Optional
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import settings
+
+# Room for the multipart boundaries and form fields around the file itself
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class StoredUpload:
+    def __init__(self, filename: str, path: str, sha256: str, size: int, deduplicated: bool = False,
+                 content_type: str = "application/octet-stream", staged: Optional[str] = None):
+        self.filename = filename
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.deduplicated = deduplicated
+        self.content_type = content_type
+        # BlobStore's staging link, until the blob reference has been counted
+        self.staged = staged
+
+
+# Leading bytes of the formats students actually upload
+MAGIC_NUMBERS = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+]
+
+# Containers whose real type (docx, pptx, doc, ...) only the extension can tell
+GENERIC_TYPES = {"application/zip", "application/x-ole-storage", "text/plain", "application/octet-stream"}
+
+
+def sniff_content_type(head: bytes, filename: Optional[str]) -> str:
+    """Content type from the file's first bytes, refined by its extension."""
+    guessed = mimetypes.guess_type(filename or "")[0]
+    sniffed = "application/octet-stream"
+    for magic, content_type in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            sniffed = content_type
+            break
+    else:
+        try:
+            if head and b"\x00" not in head:
+                head.decode("utf-8")
+                sniffed = "text/plain"
+        except UnicodeDecodeError:
+            # A chunk boundary can split a multi-byte character; only the tail may fail
+            if b"\x00" not in head and len(head) > 4:
+                try:
+                    head[:-4].decode("utf-8")
+                    sniffed = "text/plain"
+                except UnicodeDecodeError:
+                    pass
+    if sniffed in GENERIC_TYPES and guessed:
+        return guessed
+    return sniffed
+
+
+def extension_for(content_type: str, filename: Optional[str]) -> str:
+    """Keep the uploaded extension unless it contradicts the sniffed type."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if mimetypes.guess_type(f"x{ext}")[0] == content_type:
+        return ext
+    return mimetypes.guess_extension(content_type) or ext
+
+
+def max_upload_bytes() -> int:
+    return settings.max_upload_size_mb * 1024 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the {settings.max_upload_size_mb} MB upload limit",
+    )
+
+
+async def hash_upload(file: UploadFile):
+    """Hash an upload chunk by chunk without writing it anywhere.
+
+    Returns (sha256, size, content_type) and rewinds the file so it can be
+    streamed again. The content type is sniffed from the first chunk.
+    """
+    limit = max_upload_bytes()
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+    while True:
+        chunk = await file.read(settings.upload_chunk_size)
+        if content_type is None:
+            content_type = sniff_content_type(chunk[:2048], file.filename)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            await file.close()
+            raise _too_large()
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size, content_type
+
+
+async def stream_upload(file: UploadFile, dest_dir: str, filename: Optional[str] = None) -> StoredUpload:
+    """Stream an upload to dest_dir in fixed-size chunks.
+
+    The bytes go to a temporary file next to the final location while the
+    SHA-256 is computed on the fly, then the file is atomically renamed into
+    place. Memory use stays at one chunk regardless of file size.
+    """
+    if filename:
+        unique_filename = filename
+    else:
+        file_extension = os.path.splitext(file.filename or "")[1]
+        unique_filename = f"{uuid.uuid4()}{file_extension}"
+    final_path = os.path.join(dest_dir, unique_filename)
+    tmp_path = os.path.join(dest_dir, f".{uuid.uuid4()}.part")
+
+    limit = max_upload_bytes()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out_file:
+            while True:
+                chunk = await file.read(settings.upload_chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise _too_large()
+                digest.update(chunk)
+                await out_file.write(chunk)
+        await aiofiles.os.replace(tmp_path, final_path)
+    except BaseException:
+        # Never leave half-written files behind in the storage directory
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+        raise
+    finally:
+        await file.close()
+
+    return StoredUpload(unique_filename, final_path, digest.hexdigest(), size)
+
+
+class UploadSizeGuard:
+    """Caps the request body of upload routes before it is parsed (413).
+
+    Starlette spools a whole multipart body to disk before the handler sees
+    the first file, so the per-file checks above only run once everything
+    has been received. This rejects a declared Content-Length over the
+    route's limit up front, and counts the bytes actually received for
+    chunked or understated bodies. `limits` maps paths to byte limits.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def _reject(self, send: Send, limit: int):
+        body = json.dumps({"detail": f"Request body exceeds the {limit // (1024 * 1024)} MB limit"}).encode()
+        await send({"type": "http.response.start", "status": 413, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope.get("headers", [])).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        started = False
+
+        async def guarded_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing, which passes HTTPException through
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds the {limit // (1024 * 1024)} MB limit")
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, guarded_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or started:
+                raise
+            await self._reject(send, limit)
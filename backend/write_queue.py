@@ -0,0 +1,168 @@
+import asyncio
+import glob
+import os
+from typing import Awaitable, Callable, List, Optional
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from database import get_db, settings
+
+
+class WriteBehindQueue:
+    """Buffers inserts for one collection and flushes them with insert_many.
+
+    Documents get their `_id` when they are enqueued, so callers can return it
+    straight away and a retried batch is idempotent (duplicate keys from a
+    partially applied batch are ignored). While the database is unreachable
+    the pending documents are kept in memory and mirrored to a JSONL journal,
+    which is replayed on the next start. Each process writes its own journal
+    next to `journal_path`, so workers never overwrite each other's, and
+    replays every journal it finds (including those of other or dead
+    workers; a document replayed twice is a duplicate key and ignored).
+
+    `on_insert` gets every batch that landed, replayed duplicates included,
+    for follow-up writes that must wait for the insert (the resources queue
+    counts blob references there, see BlobStore.commit_staged). It has to be
+    idempotent; anything it leaves undone must be picked up elsewhere.
+    """
+
+    def __init__(self, collection: str, journal_path: Optional[str] = None,
+                 on_flush: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_insert: Optional[Callable[[List[dict]], Awaitable[None]]] = None):
+        self.collection = collection
+        self.journal_path = journal_path
+        self._journal_file: Optional[str] = None
+        # Called after every batch lands, e.g. to invalidate cached reads
+        self.on_flush = on_flush
+        self.on_insert = on_insert
+        self.flush_interval = settings.write_flush_interval_ms / 1000
+        self.batch_size = settings.write_batch_size
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._journal_dirty = False
+
+    def enqueue(self, doc: dict) -> ObjectId:
+        doc.setdefault("_id", ObjectId())
+        self._pending.append(doc)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return doc["_id"]
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        if self.journal_path:
+            # Named after the pid at start, i.e. after a preloading server forked
+            root, ext = os.path.splitext(self.journal_path)
+            self._journal_file = f"{root}.{os.getpid()}{ext}"
+        self._load_journal()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Final drain; anything left over goes to the journal
+        while self._pending and await self.flush():
+            pass
+        self._save_journal()
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            if await self.flush():
+                backoff = self.flush_interval
+            else:
+                backoff = min(backoff * 2, 30)
+
+    async def flush(self) -> bool:
+        """Write one batch. Returns False if the batch has to be retried."""
+        if not self._pending:
+            return True
+        db = get_db()
+        if db is None:
+            self._save_journal()
+            return False
+
+        batch = self._pending[:self.batch_size]
+        try:
+            await db[self.collection].insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            retry = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            if retry:
+                print(f"Write queue ({self.collection}) batch error: {retry[0].get('errmsg')}")
+                self._save_journal()
+                return False
+        except Exception as e:
+            print(f"Write queue ({self.collection}) flush error: {e}")
+            self._save_journal()
+            return False
+
+        del self._pending[:len(batch)]
+        if self._journal_dirty:
+            self._save_journal()
+        if self.on_insert is not None:
+            try:
+                await self.on_insert(batch)
+            except Exception as e:
+                print(f"Write queue ({self.collection}) insert hook error: {e}")
+        if self.on_flush is not None:
+            await self.on_flush()
+        return True
+
+    def _load_journal(self):
+        if not self._journal_file:
+            return
+        root, ext = os.path.splitext(self.journal_path)
+        paths = glob.glob(f"{glob.escape(root)}*{ext}")
+        replayed = []
+        for path in paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    replayed += [json_util.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                continue  # another worker replayed it first
+        known = {doc["_id"] for doc in self._pending}
+        for doc in replayed:
+            if doc["_id"] not in known:
+                known.add(doc["_id"])
+                self._pending.append(doc)
+        if replayed:
+            print(f"Write queue ({self.collection}): replaying {len(replayed)} journaled documents")
+            # Take over the documents before removing the other journals
+            self._save_journal()
+            for path in paths:
+                if path != self._journal_file:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def _save_journal(self):
+        if not self._journal_file:
+            return
+        if not self._pending:
+            if os.path.exists(self._journal_file):
+                os.remove(self._journal_file)
+            self._journal_dirty = False
+            return
+        tmp_path = f"{self._journal_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc in self._pending:
+                f.write(json_util.dumps(doc) + "\n")
+        os.replace(tmp_path, self._journal_file)
+        self._journal_dirty = True
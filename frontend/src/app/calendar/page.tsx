@@ -2,6 +2,7 @@
 
 import { Calendar as CalendarIcon, ChevronLeft, ChevronRight, Plus, Loader2 } from 'lucide-react';
 import { useState, useEffect } from 'react';
+import { applyChange, useLiveUpdates } from '@/lib/liveUpdates';
 
 interface Event {
     id: string;
@@ -18,47 +19,51 @@ export default function CalendarPage() {
     const [selectedDay, setSelectedDay] = useState<number | null>(null);
     const [newEvent, setNewEvent] = useState({ title: '', date: '2026-02-15', type: 'Assignment' });
 
+    const loadAll = async () => {
+        setLoading(true);
+        try {
+            // Fetch both events and exams
+            const [eventsRes, examsRes] = await Promise.all([
+                fetch('http://localhost:8000/api/events').then(r => r.ok ? r.json() : []),
+                fetch('http://localhost:8000/api/exams').then(r => r.ok ? r.json() : [])
+            ]);
+
+            // Format exams into event format
+            const formattedExams = (examsRes || []).map((exam: any) => ({
+                id: `exam-${exam.id}`,
+                title: `EXAM: ${exam.name}`,
+                date: exam.date.split('T')[0],
+                type: 'Exam',
+                status: 'due'
+            }));
+
+            // Fallback sample events if everything remains empty
+            const sampleEvents: Event[] = [
+                { id: 's1', title: 'Start of Semester', date: '2026-02-02', type: 'Academic', status: 'upcoming' },
+                { id: 's2', title: 'CS101 Lab Submission', date: '2026-02-12', type: 'Assignment', status: 'upcoming' },
+            ];
+
+            const merged = [...(eventsRes || []), ...formattedExams];
+            setEvents(merged.length > 0 ? merged : sampleEvents);
+        } catch (err) {
+            console.error('Calendar load error:', err);
+            // Fallback to sample data instead of hanging loader
+            setEvents([
+                { id: 's1', title: 'Start of Semester', date: '2026-02-02', type: 'Academic', status: 'upcoming' },
+                { id: 's2', title: 'CS101 Lab Submission', date: '2026-02-12', type: 'Assignment', status: 'upcoming' },
+            ]);
+        } finally {
+            setLoading(false);
+        }
+    };
+
     useEffect(() => {
-        const loadAll = async () => {
-            setLoading(true);
-            try {
-                // Fetch both events and exams
-                const [eventsRes, examsRes] = await Promise.all([
-                    fetch('http://localhost:8000/api/events').then(r => r.ok ? r.json() : []),
-                    fetch('http://localhost:8000/api/exams').then(r => r.ok ? r.json() : [])
-                ]);
-
-                // Format exams into event format
-                const formattedExams = (examsRes || []).map((exam: any) => ({
-                    id: `exam-${exam.id}`,
-                    title: `EXAM: ${exam.name}`,
-                    date: exam.date.split('T')[0],
-                    type: 'Exam',
-                    status: 'due'
-                }));
-
-                // Fallback sample events if everything remains empty
-                const sampleEvents: Event[] = [
-                    { id: 's1', title: 'Start of Semester', date: '2026-02-02', type: 'Academic', status: 'upcoming' },
-                    { id: 's2', title: 'CS101 Lab Submission', date: '2026-02-12', type: 'Assignment', status: 'upcoming' },
-                ];
-
-                const merged = [...(eventsRes || []), ...formattedExams];
-                setEvents(merged.length > 0 ? merged : sampleEvents);
-            } catch (err) {
-                console.error('Calendar load error:', err);
-                // Fallback to sample data instead of hanging loader
-                setEvents([
-                    { id: 's1', title: 'Start of Semester', date: '2026-02-02', type: 'Academic', status: 'upcoming' },
-                    { id: 's2', title: 'CS101 Lab Submission', date: '2026-02-12', type: 'Assignment', status: 'upcoming' },
-                ]);
-            } finally {
-                setLoading(false);
-            }
-        };
         loadAll();
     }, []);
 
+    // Events added by anyone show up without reloading
+    useLiveUpdates(['events'], change => setEvents(prev => applyChange(prev, change)), () => loadAll());
+
     const handleAddEvent = async () => {
         if (!newEvent.title || !newEvent.date) return;
         const tempId = Math.random().toString();
@@ -69,11 +74,18 @@ export default function CalendarPage() {
         setShowAddModal(false);
 
         try {
-            await fetch('http://localhost:8000/api/events', {
+            const res = await fetch('http://localhost:8000/api/events', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(eventToAdd)
             });
+            if (res.ok) {
+                // Swap the temporary ID for the real one; the live feed may already have added it
+                const { event } = await res.json();
+                setEvents(prev => prev.some(e => e.id === event.id)
+                    ? prev.filter(e => e.id !== tempId)
+                    : prev.map(e => (e.id === tempId ? { ...e, id: event.id } : e)));
+            }
         } catch (err) {
             console.error('Add event error:', err);
         }
@@ -3,6 +3,7 @@
 import { Search, Filter, BookOpen, Download, FileText, Loader2, X } from 'lucide-react';
 import { useState, useEffect, Suspense } from 'react';
 import { useSearchParams } from 'next/navigation';
+import { recordView } from '@/lib/resourceViews';
 
 interface Resource {
     id: string;
@@ -61,6 +62,8 @@ function ExploreContent() {
             if (filterSemester) params.append('semester', filterSemester);
             if (filterYear) params.append('year', filterYear);
             if (searchQuery) params.append('search', searchQuery);
+            // Cards only render these; skip long descriptions in the list payload
+            params.append('fields', 'subject,downloads,filename');
 
             const res = await fetch(`http://localhost:8000/api/resources?${params.toString()}`);
             const data = await res.json();
@@ -85,7 +88,12 @@ function ExploreContent() {
             alert("This is a preview resource without a real file attachment.");
             return;
         }
-        window.open(`http://localhost:8000/api/download/${res.filename}`, '_blank');
+        window.open(`http://localhost:8000/api/download/${res.filename}?resource_id=${res.id}`, '_blank');
+    };
+
+    const handleOpen = (res: Resource) => {
+        recordView(res.id);
+        handleDownload(res);
     };
 
     return (
@@ -251,7 +259,7 @@ function ExploreContent() {
                                     </div>
                                 </div>
 
-                                <div className="flex-1 cursor-pointer" onClick={() => handleDownload(res)}>
+                                <div className="flex-1 cursor-pointer" onClick={() => handleOpen(res)}>
                                     <h3 className="font-bold text-gray-900 group-hover:text-primary transition-colors text-lg line-clamp-2 leading-tight mb-2">
                                         {res.title}
                                     </h3>
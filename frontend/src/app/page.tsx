@@ -13,9 +13,21 @@ import {
 import { useState, useEffect } from 'react';
 import Link from 'next/link';
 import ExamTimer from '@/components/ExamTimer';
+import { recordView } from '@/lib/resourceViews';
+
+interface TrendingResource {
+  id: string;
+  title: string;
+  course: string;
+  type: string;
+  author: string;
+  filename?: string;
+  trending_score: number;
+}
 
 export default function Home() {
   const [user, setUser] = useState<any>(null);
+  const [trending, setTrending] = useState<TrendingResource[]>([]);
 
   useEffect(() => {
     const token = localStorage.getItem('token');
@@ -29,6 +41,16 @@ export default function Home() {
     }
   }, []);
 
+  // Trending in the student's course when we know it, otherwise across the hub
+  useEffect(() => {
+    const params = new URLSearchParams({ limit: '4' });
+    if (user?.course) params.set('course', user.course);
+    fetch(`http://localhost:8000/api/resources/trending?${params.toString()}`)
+      .then(res => (res.ok ? res.json() : []))
+      .then(data => setTrending(Array.isArray(data) ? data : []))
+      .catch(err => console.error(err));
+  }, [user?.course]);
+
   return (
     <div className="space-y-8 animate-in fade-in duration-500">
       {/* Welcome Section */}
@@ -59,8 +81,38 @@ export default function Home() {
       </div>
 
       <div className="grid grid-cols-1 lg:grid-cols-3 gap-8">
-        {/* Recent Resources */}
+        {/* Trending + Recent Resources */}
         <div className="lg:col-span-2 space-y-4">
+          {trending.length > 0 && (
+            <>
+              <div className="flex items-center justify-between">
+                <h2 className="text-xl font-bold text-gray-900 flex items-center gap-2">
+                  <TrendingUp size={20} className="text-emerald-500" />
+                  Trending this week
+                </h2>
+              </div>
+              <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+                {trending.map(res => (
+                  <div
+                    key={res.id}
+                    onClick={() => {
+                      recordView(res.id);
+                      if (res.filename) window.open(`http://localhost:8000/api/download/${res.filename}?resource_id=${res.id}`, '_blank');
+                    }}
+                  >
+                    <ResourceCard
+                      title={res.title}
+                      course={res.course}
+                      author={res.author || 'Anonymous'}
+                      type={res.type}
+                      date={`${res.trending_score.toFixed(1)} pts`}
+                    />
+                  </div>
+                ))}
+              </div>
+            </>
+          )}
+
           <div className="flex items-center justify-between">
             <h2 className="text-xl font-bold text-gray-900">Recent Resources</h2>
             <Link href="/explore" className="text-sm font-semibold text-primary hover:underline">View all</Link>
@@ -2,6 +2,7 @@
 
 import { Star, Send, User, MessageSquare, CheckCircle, Search, Filter } from 'lucide-react';
 import { useState, useEffect } from 'react';
+import { applyChange, useLiveUpdates } from '@/lib/liveUpdates';
 
 interface Teacher {
     name: string;
@@ -32,6 +33,9 @@ export default function RatingsPage() {
         fetchRatings();
     }, []);
 
+    // New ratings from anyone (including our own submissions) are pushed by the server
+    useLiveUpdates(['reviews'], change => setRatings(prev => applyChange(prev, change, true)), () => fetchRatings());
+
     const fetchTeachers = async () => {
         try {
             const res = await fetch('http://localhost:8000/api/teachers');
@@ -95,7 +99,11 @@ export default function RatingsPage() {
                 setRatings(prev => prev.filter(r => r.id !== newRating.id));
                 alert("Failed to submit rating. Please try again.");
             } else {
-                fetchRatings(); // Refresh to get real ID
+                // Swap the temporary ID for the real one; the live feed may already have added it
+                const { id } = await res.json();
+                setRatings(prev => prev.some(r => r.id === id)
+                    ? prev.filter(r => r.id !== newRating.id)
+                    : prev.map(r => (r.id === newRating.id ? { ...r, id } : r)));
             }
         } catch (err) {
             console.error(err);
@@ -0,0 +1,49 @@
+"use client";
+
+import { useEffect, useRef } from 'react';
+
+export interface LiveChange<T = any> {
+    collection: string;
+    op: 'insert' | 'update' | 'delete';
+    id: string;
+    doc?: T;
+}
+
+// Subscribes to server-pushed changes (SSE) instead of polling.
+// onResync fires when the stream reconnects or the server dropped our backlog:
+// changes may have been missed, so the page should refetch its list.
+export function useLiveUpdates(
+    collections: string[],
+    onChange: (change: LiveChange) => void,
+    onResync?: () => void
+) {
+    const handlers = useRef({ onChange, onResync });
+    handlers.current = { onChange, onResync };
+    const key = collections.join(',');
+
+    useEffect(() => {
+        const source = new EventSource(`http://localhost:8000/api/live?collections=${encodeURIComponent(key)}`);
+        let opened = false;
+
+        source.addEventListener('change', (e) => {
+            handlers.current.onChange(JSON.parse((e as MessageEvent).data));
+        });
+        source.addEventListener('resync', () => handlers.current.onResync?.());
+        source.onopen = () => {
+            if (opened) handlers.current.onResync?.();
+            opened = true;
+        };
+
+        return () => source.close();
+    }, [key]);
+}
+
+// Applies a change to a list of records keyed by id
+export function applyChange<T extends { id?: string }>(items: T[], change: LiveChange<T>, prepend = false): T[] {
+    if (change.op === 'delete') return items.filter(item => item.id !== change.id);
+    if (!change.doc) return items;
+    if (items.some(item => item.id === change.id)) {
+        return items.map(item => (item.id === change.id ? change.doc! : item));
+    }
+    return prepend ? [change.doc, ...items] : [...items, change.doc];
+}
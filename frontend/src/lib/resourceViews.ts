@@ -0,0 +1,8 @@
+// Opening a resource counts as a view for the trending ranking.
+// Fire and forget: keepalive lets the request outlive the click that opens a new tab.
+export function recordView(id: string) {
+    fetch(`http://localhost:8000/api/resources/${encodeURIComponent(id)}/view`, {
+        method: 'POST',
+        keepalive: true
+    }).catch(() => {});
+}